@@ -0,0 +1,69 @@
+import asyncio
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Maximum number of blocking API calls in flight at any time
+DEFAULT_CONCURRENCY = 16
+
+class Collector:
+    """Bounded asyncio fan-out engine for read-only API collection.
+
+    Blocking calls (PyGithub, requests) are run on a worker pool through
+    `call`, which holds a semaphore so that at most `concurrency` requests are
+    in flight. `run` starts one `fetch` coroutine per input item, keeping at
+    most `window` items ahead of the oldest unfinished one, and hands results to
+    `on_result` strictly in input order so they can be streamed to a CSV file.
+    The items are pulled on a thread of their own, so an iterator that blocks
+    (e.g. one paging through the API) never stalls the event loop.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, window=None):
+        self.concurrency = max(1, concurrency)
+        self.window = window or self.concurrency * 8
+        self._semaphore = None
+        self._executor = None
+
+    async def call(self, func, *args, **kwargs):
+        """Run a blocking call on the worker pool, bounded by the semaphore."""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def gather(self, *calls):
+        """Run several independent blocking calls concurrently.
+
+        Each call is a callable taking no arguments, e.g. `repo.get_branches` or
+        a lambda; the results are returned in the same order as the calls.
+        """
+        return await asyncio.gather(*(self.call(c) for c in calls))
+
+    def run(self, items, fetch, on_result):
+        """Collect `fetch(item)` for every item and pass each result to `on_result(item, result)` in input order."""
+        return asyncio.run(self._run(items, fetch, on_result))
+
+    async def _run(self, items, fetch, on_result):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        items = iter(items)
+        end = object()
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor, \
+                ThreadPoolExecutor(max_workers=1) as feeder:
+            self._executor = executor
+            try:
+                while True:
+                    item = await loop.run_in_executor(feeder, next, items, end)
+                    if item is end:
+                        break
+                    pending.append((item, asyncio.ensure_future(fetch(item))))
+                    if len(pending) >= self.window:
+                        done_item, task = pending.popleft()
+                        on_result(done_item, await task)
+                while pending:
+                    done_item, task = pending.popleft()
+                    on_result(done_item, await task)
+            finally:
+                for _, task in pending:
+                    task.cancel()
+                self._executor = None
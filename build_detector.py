@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import tempfile
+
+NO_BUILD_SYSTEM = "No common build system detected."
+
+# Directory holding build-detection results keyed by root tree SHA
+DEFAULT_CACHE_DIR = ".build_detection_cache"
+
+# Indicator file names of every build system the scripts know about. Detection
+# always classifies with this one table, so a cached result serves every
+# script; each script then reports the systems it is interested in.
+BUILD_INDICATORS = {
+    'maven': 'pom.xml',
+    'gradle': ('build.gradle', 'build.gradle.kts', 'settings.gradle', 'settings.gradle.kts'),
+    'npm': 'package.json',
+    'yarn': 'yarn.lock',
+    'make': ('Makefile', 'makefile', 'GNUmakefile'),
+    'cmake': 'CMakeLists.txt',
+    'bazel': ('BUILD', 'BUILD.bazel', 'WORKSPACE', 'WORKSPACE.bazel'),
+    'go': 'go.mod',
+    'rust': 'Cargo.toml',
+    'python_setuptools': 'setup.py',
+    'python_pip': 'requirements.txt',
+    'python_pyproject': 'pyproject.toml',
+    'ruby_bundler': 'Gemfile',
+    'ruby_gem': '.gemspec',
+    'dotNET_CS': '.csproj',
+    'dotNET_VB': '.vbproj',
+    'dotNET_FS': '.fsproj',
+    'dotNET_Solution': '.sln',
+    'dotNET_SDK': 'global.json',
+    'dotNET_NuGet': 'packages.config'
+}
+
+class BuildSystemMatcher:
+    """Classify repository paths into build systems in a single linear pass.
+
+    `indicators` maps a build system to its indicator file name(s). Indicators
+    starting with a dot (".csproj", ".gemspec") match by file extension, all
+    others match the exact file name, so "BUILD" no longer matches
+    "BUILDING.md". Unlike the `endswith` checks of old_scripts/, a name
+    never matches a longer one, so variants such as "build.gradle.kts" must
+    be listed as indicators of their own. Both kinds are compiled into
+    dictionaries once, which makes the cost of classifying a path
+    independent of the number of indicators.
+    """
+
+    def __init__(self, indicators=BUILD_INDICATORS):
+        self.build_systems = list(indicators)
+        self._by_name = {}
+        self._by_suffix = {}
+        for build_system, names in indicators.items():
+            if isinstance(names, str):
+                names = (names,)
+            for name in names:
+                table = self._by_suffix if name.startswith('.') else self._by_name
+                table.setdefault(name, []).append(build_system)
+        # Identifies the indicator table, so results cached under an older table are not reused
+        table_json = json.dumps(indicators, sort_keys=True)
+        self.fingerprint = hashlib.sha1(table_json.encode('utf-8')).hexdigest()[:12]
+
+    def match(self, path):
+        """Return the build systems indicated by a single path."""
+        file_name = path.rsplit('/', 1)[-1]
+        systems = self._by_name.get(file_name, [])
+        dot = file_name.rfind('.')
+        if dot > 0:
+            systems = systems + self._by_suffix.get(file_name[dot:], [])
+        return systems
+
+    def classify(self, paths):
+        """Return {build_system: [paths]} for every build system found, in indicator order."""
+        found = {}
+        for path in paths:
+            for build_system in self.match(path):
+                found.setdefault(build_system, []).append(path)
+        return {build_system: found[build_system] for build_system in self.build_systems if build_system in found}
+
+class BuildDetectionCache:
+    """On-disk cache of build-detection results keyed by root tree SHA.
+
+    A git tree SHA names the exact content of a tree, so a result stored under
+    it is valid for any repository, branch or run that sees the same tree,
+    including the source and target of a migrated repository. Each entry is a
+    small JSON file written atomically, so concurrent scripts can share the
+    cache directory.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, tree_sha, matcher):
+        return os.path.join(self.cache_dir, f"{tree_sha}-{matcher.fingerprint}.json")
+
+    def get(self, tree_sha, matcher):
+        """Return the cached {build_system: [paths]} for a tree, or None."""
+        try:
+            with open(self._path(tree_sha, matcher), 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, tree_sha, matcher, found):
+        """Store the detection result for a tree, creating the cache directory on the first write."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        except OSError as e:
+            print(f"Warning: could not write build-detection cache entry for tree {tree_sha}: {e}")
+            return
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(found, file)
+            os.replace(tmp_path, self._path(tree_sha, matcher))
+        except OSError as e:
+            print(f"Warning: could not write build-detection cache entry for tree {tree_sha}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+def fetch_tree_paths(memo, repo_name, ref):
+    """List every file path of a repository with one recursive git-trees call.
+
+    Returns the paths and whether GitHub truncated the listing.
+    """
+    tree = memo.get_tree(repo_name, ref)
+    if tree.truncated:
+        print(f"Warning: file tree of {repo_name}@{ref} is truncated; build files in the omitted paths are not detected.")
+    return [entry.path for entry in tree.tree if entry.type == 'blob'], tree.truncated
+
+def detect_build_systems(memo, repo_name, matcher, ref=None, cache=None):
+    """Detect the build systems of a repository from its full file tree.
+
+    `ref` is a branch name and defaults to the repository's default branch.
+    With a cache, the branch is first resolved to its root tree SHA (a single
+    lightweight lookup) and the tree listing is skipped entirely when that tree
+    has been classified before.
+    """
+    if ref is None:
+        ref = memo.get_repo(repo_name).default_branch
+    if cache is None:
+        paths, _ = fetch_tree_paths(memo, repo_name, ref)
+        return matcher.classify(paths)
+
+    tree_sha = memo.get_branch(repo_name, ref).commit.commit.tree.sha
+    found = cache.get(tree_sha, matcher)
+    if found is None:
+        paths, truncated = fetch_tree_paths(memo, repo_name, tree_sha)
+        found = matcher.classify(paths)
+        if not truncated:
+            cache.put(tree_sha, matcher, found)
+    return found
+
+def select_build_systems(found, build_systems):
+    """Keep only the given build systems of a detection result, in indicator order."""
+    return {build_system: paths for build_system, paths in found.items() if build_system in build_systems}
+
+def format_build_systems(found):
+    """Format detected build systems the way the summary CSVs record them."""
+    return ', '.join(found) if found else NO_BUILD_SYSTEM
+
+def format_build_files(found):
+    """Format the paths where each build system was found, e.g. "maven: pom.xml, api/pom.xml; npm: web/package.json"."""
+    return '; '.join(f"{build_system}: {', '.join(paths)}" for build_system, paths in found.items())
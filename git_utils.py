@@ -0,0 +1,246 @@
+import base64
+import os
+import subprocess
+import threading
+
+# Never let git block on an interactive credential prompt in a batch run
+GIT_ENV = dict(os.environ, GIT_TERMINAL_PROMPT='0')
+
+def github_url(repo_name):
+    """Return the HTTPS clone URL of an org/repo."""
+    return f"https://github.com/{repo_name}.git"
+
+def git_command(args, token=None):
+    """Build a git command line, authenticating GitHub requests with the token when given.
+
+    The token is passed as an HTTP header for this invocation only, so it never
+    ends up in a remote URL, the repository config or git's error messages.
+    """
+    command = ['git']
+    if token:
+        credentials = base64.b64encode(f"x-access-token:{token}".encode('utf-8')).decode('ascii')
+        command += ['-c', f'http.https://github.com/.extraheader=AUTHORIZATION: basic {credentials}']
+    return command + list(args)
+
+def run_git(args, cwd=None, token=None):
+    """Run a git command and return its stdout.
+
+    Raises RuntimeError with git's message when it fails.
+    """
+    result = subprocess.run(git_command(args, token), cwd=cwd, env=GIT_ENV, capture_output=True)
+    if result.returncode != 0:
+        message = result.stderr.decode('utf-8', 'replace').strip()
+        raise RuntimeError(f"git {args[0]} failed: {message}")
+    return result.stdout
+
+def ls_remote(url, token=None):
+    """Return {ref name: sha} for every branch and tag a remote advertises.
+
+    This only reads the remote's ref advertisement over the git protocol: no
+    clone, and no REST API quota. Annotated tags also appear peeled, as
+    "refs/tags/<name>^{}" pointing at the tagged commit.
+    """
+    refs = {}
+    output = run_git(['ls-remote', '--heads', '--tags', url], token=token)
+    for line in output.decode('utf-8').splitlines():
+        sha, _, ref = line.partition('\t')
+        if ref:
+            refs[ref] = sha
+    return refs
+
+def is_mirror(path):
+    """Tell whether a local repository is a full mirror (git clone --mirror)."""
+    try:
+        return run_git(['config', '--get', 'remote.origin.mirror'], cwd=path).strip() == b'true'
+    except RuntimeError:
+        return False
+
+def ensure_repository(repo_name, path, token=None, mirror=False):
+    """Clone a GitHub repository into `path`, or bring the clone already there up to date.
+
+    An existing full mirror is always reused and fetched with --prune.
+    Otherwise a new clone is a shallow, bare, single-branch clone of the
+    default branch, or a full mirror when `mirror` is set; with `mirror`, an
+    existing shallow clone is converted into a full mirror.
+    """
+    if os.path.isdir(path):
+        if mirror and not is_mirror(path):
+            # Turn an existing shallow clone into a full mirror in place
+            run_git(['config', 'remote.origin.fetch', '+refs/*:refs/*'], cwd=path)
+            run_git(['config', 'remote.origin.mirror', 'true'], cwd=path)
+        if is_mirror(path):
+            fetch = ['fetch', '--prune', 'origin']
+            if os.path.exists(os.path.join(path, 'shallow')):
+                fetch.insert(1, '--unshallow')
+            run_git(fetch, cwd=path, token=token)
+        else:
+            run_git(['fetch', '--depth', '1', 'origin', 'HEAD'], cwd=path, token=token)
+            run_git(['update-ref', 'HEAD', 'FETCH_HEAD'], cwd=path)
+        return path
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if mirror:
+        run_git(['clone', '--mirror', '--quiet', github_url(repo_name), path], token=token)
+    else:
+        run_git(['clone', '--bare', '--depth', '1', '--single-branch', '--quiet', github_url(repo_name), path], token=token)
+    return path
+
+def sparse_checkout(repo_name, path, patterns, token=None):
+    """Check out only the files matching `patterns` of a repository's default branch into `path`.
+
+    The clone is shallow and blobless (--filter=blob:none): commits and trees
+    are downloaded, but file contents only for the paths the sparse-checkout
+    patterns (gitignore style, e.g. "*.tf") select, in one batch when they are
+    checked out. An existing checkout is moved to the latest default-branch
+    commit the same way.
+    """
+    if os.path.isdir(path):
+        run_git(['fetch', '--quiet', '--depth', '1', '--filter=blob:none', 'origin', 'HEAD'], cwd=path, token=token)
+        run_git(['sparse-checkout', 'set', '--no-cone'] + list(patterns), cwd=path, token=token)
+        run_git(['reset', '--quiet', '--hard', 'FETCH_HEAD'], cwd=path, token=token)
+        return path
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    run_git(['clone', '--quiet', '--filter=blob:none', '--depth', '1', '--single-branch', '--no-checkout',
+             github_url(repo_name), path], token=token)
+    run_git(['sparse-checkout', 'set', '--no-cone'] + list(patterns), cwd=path, token=token)
+    run_git(['checkout', '--quiet'], cwd=path, token=token)
+    return path
+
+def current_branch(path):
+    """Return the branch checked out in a local repository."""
+    return run_git(['symbolic-ref', '--short', 'HEAD'], cwd=path).decode('utf-8').strip()
+
+def rev_parse(path, rev='HEAD'):
+    """Resolve a revision of a local repository to its SHA."""
+    return run_git(['rev-parse', '--verify', f'{rev}^{{commit}}'], cwd=path).decode('ascii').strip()
+
+def ls_tree(path, rev='HEAD'):
+    """Yield (blob sha, size, path) for every file in a revision, without a checkout."""
+    output = run_git(['ls-tree', '-r', '-l', '-z', rev], cwd=path)
+    for entry in output.split(b'\0'):
+        if not entry:
+            continue
+        info, _, file_path = entry.partition(b'\t')
+        _, object_type, sha, size = info.split()
+        if object_type == b'blob':
+            yield sha.decode('ascii'), int(size), file_path.decode('utf-8', 'surrogateescape')
+
+def diff_trees(path, old_rev, new_rev, old_path=None):
+    """Yield (old blob sha, new blob sha, path) for every file that differs between two revisions.
+
+    The sha of the side a file is missing from is None. git compares the
+    trees directly, skipping unchanged subtrees without opening them, so
+    the cost follows the size of the change rather than of the repository.
+    `old_rev` may belong to another local repository, `old_path` (e.g. the
+    source mirror of a migration), whose objects are then made visible to
+    this one for the duration of the command.
+    """
+    env = GIT_ENV
+    if old_path is not None:
+        old_rev = rev_parse(old_path, old_rev)
+        objects = run_git(['rev-parse', '--git-path', 'objects'], cwd=old_path).decode('utf-8').strip()
+        env = dict(GIT_ENV, GIT_ALTERNATE_OBJECT_DIRECTORIES=os.path.abspath(os.path.join(old_path, objects)))
+    result = subprocess.run(['git', 'diff-tree', '-r', '-z', '--no-renames', '--raw', '--no-abbrev', old_rev, new_rev],
+                            cwd=path, env=env, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"git diff-tree failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+    tokens = result.stdout.split(b'\0')
+    for meta, file_path in zip(tokens[0::2], tokens[1::2]):
+        # ":<old mode> <new mode> <old sha> <new sha> <status>"
+        old_mode, new_mode, old_sha, new_sha, _ = meta.lstrip(b':').split()
+        if b'160000' in (old_mode, new_mode):
+            continue
+        yield (None if old_mode == b'000000' else old_sha.decode('ascii'),
+               None if new_mode == b'000000' else new_sha.decode('ascii'),
+               file_path.decode('utf-8', 'surrogateescape'))
+
+def large_blobs(path, max_size):
+    """Return the SHAs of the blobs of a local repository larger than `max_size` bytes."""
+    output = run_git(['cat-file', '--batch-all-objects', '--batch-check=%(objectname) %(objecttype) %(objectsize)'], cwd=path)
+    large = set()
+    for line in output.splitlines():
+        sha, object_type, size = line.split()
+        if object_type == b'blob' and int(size) > max_size:
+            large.add(sha.decode('ascii'))
+    return large
+
+def iter_history(path):
+    """Yield (commit sha, blob sha, path) for every file version added or modified in any reachable commit.
+
+    Commits are walked oldest first across all refs, so the first time a blob
+    appears is the commit and path that introduced it. Merge commits are
+    diffed against each parent, so content introduced by a merge resolution is
+    seen as well. The output of git log is streamed, never held in memory.
+    """
+    process = subprocess.Popen(['git', 'log', '--all', '--reverse', '--date-order', '-m', '--raw', '--no-abbrev',
+                                '--no-renames', '-z', '--format=commit %H'],
+                               cwd=path, env=GIT_ENV, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    commit = None
+    meta = None
+    pending = b''
+    try:
+        while True:
+            data = process.stdout.read(65536)
+            if not data:
+                break
+            *tokens, pending = (pending + data).split(b'\0')
+            for token in tokens:
+                if meta is not None:
+                    # ":<old mode> <new mode> <old sha> <new sha> <status>" followed by the path
+                    _, new_mode, _, sha, status = meta.split()
+                    meta = None
+                    if status != b'D' and new_mode != b'160000':
+                        yield commit, sha.decode('ascii'), token.decode('utf-8', 'surrogateescape')
+                    continue
+                token = token.lstrip(b'\n')
+                if token.startswith(b'commit '):
+                    commit = token[7:].split()[0].decode('ascii')
+                elif token.startswith(b':'):
+                    meta = token
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise RuntimeError(f"git log failed in {path}")
+
+def iter_blobs(path, shas):
+    """Stream (sha, content) for many blobs from the object database in one `git cat-file --batch`.
+
+    Blobs are returned in the order of `shas`; missing objects are skipped.
+    """
+    process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=path, env=GIT_ENV,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    # Feed the requests from a thread so a full stdout pipe can never deadlock us
+    def feed():
+        try:
+            for sha in shas:
+                process.stdin.write(f"{sha}\n".encode('ascii'))
+        except BrokenPipeError:
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        while True:
+            header = process.stdout.readline()
+            if not header:
+                break
+            fields = header.split()
+            if len(fields) < 3 or fields[1] == b'missing':
+                continue
+            size = int(fields[2])
+            data = process.stdout.read(size)
+            process.stdout.read(1)  # trailing newline
+            if fields[1] == b'blob':
+                yield fields[0].decode('ascii'), data
+    finally:
+        process.stdout.close()
+        process.wait()
+        feeder.join()
@@ -1,17 +1,322 @@
 import requests
 import argparse
+import base64
 import time
 import sys
+from repo_discovery import add_discovery_arguments, discover_repositories
+from local_scanner import LocalScanner, DEFAULT_WORKDIR, DEFAULT_MAX_FILE_SIZE
+from scan_state import ScanStateStore, DEFAULT_STATE_DIR
+from match_output import MatchWriter, DEFAULT_MATCHES_FILE, DEFAULT_SUMMARY_FILE
+
+SEARCH_URL = "https://api.github.com/search/code"
+
+# GitHub rejects code search queries longer than 256 characters or with more
+# than five AND/OR/NOT operators, and never returns more than 1,000 results
+MAX_QUERY_LENGTH = 256
+MAX_QUERY_OPERATORS = 5
+MAX_SEARCH_RESULTS = 1000
+
+class SearchError(Exception):
+    """A code search request failed for a reason other than rate limiting."""
+
+def search_pages(query, headers):
+    """Run a code search and yield each page of results, waiting out rate limits."""
+    params = {'q': query, 'per_page': 100}
+    page = 1
+    while True:
+        params['page'] = page
+        search_response = requests.get(SEARCH_URL, headers=headers, params=params)
+        if search_response.status_code == 200:
+            yield search_response.json()
+            # Check if there are more pages
+            if 'next' in search_response.links:
+                page += 1
+                time.sleep(1)  # Sleep to respect rate limits
+            else:
+                break
+        elif search_response.status_code == 403:
+            if 'Retry-After' in search_response.headers:
+                retry_after = int(search_response.headers['Retry-After'])
+                print(f"    Rate limit exceeded, retrying after {retry_after} seconds...")
+                time.sleep(retry_after)
+            else:
+                reset_time = int(search_response.headers.get('X-RateLimit-Reset', time.time() + 60))
+                wait_time = max(reset_time - int(time.time()), 1)
+                print(f"    Rate limit exceeded, retrying after {wait_time} seconds...")
+                time.sleep(wait_time)
+        else:
+            raise SearchError(search_response.text)
+
+def search_repository(full_repo_name, value, headers):
+    """Search one repository for a value with a `repo:` scoped query."""
+    print(f"  Searching for '{value}'...")
+    # Build the search query
+    query = f'"{value}" repo:{full_repo_name}'
+    total_count = None
+    for search_data in search_pages(query, headers):
+        if total_count is None:
+            total_count = search_data.get('total_count', 0)
+            if total_count == 0:
+                print(f"    No matches found for '{value}' in {full_repo_name}.")
+                break
+            else:
+                print(f"    Found {total_count} matches for '{value}' in {full_repo_name}.")
+        for item in search_data.get('items', []):
+            yield {
+                'repo': full_repo_name,
+                'file': item['path'],
+                'value': value,
+                'html_url': item['html_url']
+            }
+
+def format_query(values, scope):
+    """Build an OR query over the values, e.g. '"a" OR "b" org:my-org'."""
+    return ' OR '.join(f'"{value}"' for value in values) + f' {scope}'
+
+def build_value_batches(values, scope):
+    """Pack values into as few OR queries as GitHub's query limits allow."""
+    batches = []
+    current = []
+    for value in values:
+        candidate = current + [value]
+        if current and (len(candidate) - 1 > MAX_QUERY_OPERATORS or len(format_query(candidate, scope)) > MAX_QUERY_LENGTH):
+            batches.append(current)
+            candidate = [value]
+        current = candidate
+    if current:
+        batches.append(current)
+    return batches
+
+def attribute_values(item, batch, headers):
+    """Work out which values of a batched query a search hit contains.
+
+    The text-match fragments returned with the hit are checked first. They are
+    truncated and only cover part of the file, so a value missing from them
+    may still be in the file: unless every value of the batch shows up in the
+    fragments, the file itself is fetched and the remaining values are
+    checked against it. That costs a core API call, not search quota.
+    """
+    if len(batch) == 1:
+        return batch
+    fragments = [match.get('fragment', '').lower() for match in item.get('text_matches', [])]
+    found = [value for value in batch if any(value.lower() in fragment for fragment in fragments)]
+    remaining = [value for value in batch if value not in found]
+    if not remaining:
+        return found
+
+    response = requests.get(item['url'], headers=headers)
+    if response.status_code != 200:
+        print(f"    Could not fetch {item['repository']['full_name']}/{item['path']} to attribute the hit: {response.status_code}")
+        return found
+    content = base64.b64decode(response.json().get('content', '')).decode('utf-8', 'replace').lower()
+    found_in_file = {value for value in remaining if value.lower() in content}
+    # Keep the batch order
+    return [value for value in batch if value in found or value in found_in_file]
+
+def search_batch(org_name, batch, headers, allowed_repos=None):
+    """Search the whole organization for a batch of values with a single OR query.
+
+    A batch whose hits exceed the 1,000 results the API returns is split in
+    half so that no results are lost.
+    """
+    query = format_query(batch, f'org:{org_name}')
+    print(f"  Searching for {', '.join(repr(value) for value in batch)}...")
+    match_headers = dict(headers, Accept='application/vnd.github.text-match+json')
+    total_count = None
+    for search_data in search_pages(query, match_headers):
+        if total_count is None:
+            total_count = search_data.get('total_count', 0)
+            if total_count > MAX_SEARCH_RESULTS and len(batch) > 1:
+                print(f"    {total_count} hits exceed the {MAX_SEARCH_RESULTS}-result limit; splitting the batch.")
+                half = len(batch) // 2
+                yield from search_batch(org_name, batch[:half], headers, allowed_repos)
+                yield from search_batch(org_name, batch[half:], headers, allowed_repos)
+                return
+            if total_count == 0:
+                print(f"    No matches found in {org_name}.")
+                break
+            print(f"    Found {total_count} matches in {org_name}.")
+            if total_count > MAX_SEARCH_RESULTS:
+                print(f"    Only the first {MAX_SEARCH_RESULTS} results of '{batch[0]}' can be retrieved.")
+        for item in search_data.get('items', []):
+            full_repo_name = item['repository']['full_name']
+            if allowed_repos is not None and full_repo_name not in allowed_repos:
+                continue
+            for value in attribute_values(item, batch, headers):
+                yield {
+                    'repo': full_repo_name,
+                    'file': item['path'],
+                    'value': value,
+                    'html_url': item['html_url']
+                }
+
+def search_organization(org_name, specific_values, headers, allowed_repos=None, failed_values=None):
+    """Search the organization with `org:` scoped, OR-batched queries.
+
+    Search calls scale with the number of value batches instead of
+    repositories x values. Hits are attributed back to repository and value
+    on the client side. Values of batches whose search failed are added to
+    `failed_values`.
+    """
+    for batch in build_value_batches(specific_values, f'org:{org_name}'):
+        try:
+            yield from search_batch(org_name, batch, headers, allowed_repos)
+        except SearchError as e:
+            print(f"    Failed to search code: {e}")
+            if failed_values is not None:
+                failed_values.update(batch)
+
+def group_by_value(matches, values):
+    """Group match records by value, with an empty list for values without matches.
+
+    Matches for values not in `values` are left out.
+    """
+    grouped = {value: [] for value in values}
+    for match in matches:
+        if match['value'] in grouped:
+            grouped[match['value']].append(match)
+    return grouped
+
+def ordered_matches(matches_by_value, values):
+    """Return the match records of the requested values, value by value."""
+    return [match for value in values for match in matches_by_value.get(value, [])]
+
+def scan_repositories(repos, specific_values, headers, store, full_rescan=False):
+    """Search each discovered repository with `repo:` scoped queries, yielding (repository, matches).
+
+    Values the stored state still answers for an unchanged repository are
+    not searched again.
+    """
+    repo_count = 0
+    for repo in repos:
+        repo_count += 1
+        full_repo_name = repo['full_name']
+        print(f"\nSearching in repository {full_repo_name}...")
+        _, kept, to_scan = store.plan(repo, specific_values, full_rescan)
+        if len(to_scan) < len(specific_values):
+            print(f"  Unchanged since the last scan; reusing stored matches for {len(specific_values) - len(to_scan)} value(s).")
+
+        found = {}
+        for value in to_scan:
+            try:
+                found[value] = list(search_repository(full_repo_name, value, headers))
+            except SearchError as e:
+                # Not stored, so the next run searches this value again
+                print(f"    Failed to search code: {e}")
+
+        results = {**kept, **found}
+        if found:
+            store.save(full_repo_name, repo['pushed_at'], None, results)
+        yield full_repo_name, ordered_matches(results, specific_values)
+    print(f'\nScanned {repo_count} repositories.')
+
+def scan_organization(org_name, repos, specific_values, headers, store, full_rescan=False):
+    """Search the organization with batched `org:` queries, yielding (repository, matches).
+
+    Only the values some repository still needs are searched, and only hits
+    for (repository, value) pairs that need scanning are kept; everything
+    else comes from the stored state. The stored matches are yielded first,
+    repository by repository. Hits arrive in no particular repository order,
+    so each one is then yielded on its own as soon as the search returns it.
+    The new hits are also grouped per repository for the state store, which
+    is updated once every batch has been searched.
+    """
+    records = list(repos)
+    print(f'Found {len(records)} repositories.')
+    to_scan_by_repo = {}
+    for record in records:
+        _, kept, to_scan = store.plan(record, specific_values, full_rescan)
+        if to_scan:
+            to_scan_by_repo[record['full_name']] = set(to_scan)
+        if kept:
+            yield record['full_name'], ordered_matches(kept, specific_values)
+    values = [value for value in specific_values if any(value in to_scan for to_scan in to_scan_by_repo.values())]
+
+    found = {}
+    failed_values = set()
+    if values:
+        print(f"\nSearching in organization {org_name}...")
+        allowed_repos = {record['full_name'] for record in records}
+        for match in search_organization(org_name, values, headers, allowed_repos, failed_values):
+            # Org-wide hits cover every searched value; only those this repository needed are new
+            if match['value'] in to_scan_by_repo.get(match['repo'], ()):
+                found.setdefault(match['repo'], []).append(match)
+                yield match['repo'], [match]
+    else:
+        print("\nNo repository changed and no new values; reusing stored matches.")
+
+    for record in records:
+        full_repo_name = record['full_name']
+        if full_repo_name not in to_scan_by_repo:
+            continue
+        _, kept, to_scan = store.plan(record, specific_values, full_rescan)
+        # Values of failed batches are not stored, so the next run searches them again
+        scanned = [value for value in to_scan if value not in failed_values]
+        if scanned:
+            store.save(full_repo_name, record['pushed_at'], None, {**kept, **group_by_value(found.pop(full_repo_name, []), scanned)})
+
+def scan_locally(args, repos, specific_values, store, full_rescan=False):
+    """Scan local clones of the discovered repositories, yielding (repository, matches).
+
+    Repositories not pushed since their last scan are skipped without a fetch
+    when every value is stored; a pushed repository whose default-branch head
+    did not move keeps its stored matches as well.
+    """
+    plans = {}
+
+    def repo_names():
+        for record in repos:
+            plans[record['full_name']] = (record, *store.plan(record, specific_values, full_rescan))
+            yield record['full_name']
+
+    def needs_update(full_repo_name):
+        return bool(plans[full_repo_name][3])
+
+    def needs_scan(full_repo_name, head):
+        _, state, _, to_scan = plans[full_repo_name]
+        return not (state is not None and state.get('head') == head and all(value in state['values'] for value in to_scan))
+
+    repo_count = 0
+    with LocalScanner(specific_values, workdir=args.workdir, token=args.token, max_file_size=args.max_file_size,
+                      jobs=args.jobs, ignore_case=not args.case_sensitive, history=args.history) as scanner:
+        for full_repo_name, head, repo_matches in scanner.scan_repositories(repo_names(), needs_update, needs_scan):
+            repo_count += 1
+            record, state, kept, _ = plans.pop(full_repo_name)
+            if isinstance(repo_matches, RuntimeError):
+                print(f"\nSkipping repository {full_repo_name}: {repo_matches}")
+                continue
+            if repo_matches is None:
+                print(f"\nRepository {full_repo_name} is unchanged since the last scan; reusing stored matches.")
+                results = kept if head is None else state['values']
+                if head is not None:
+                    store.save(full_repo_name, record['pushed_at'], head, results)
+            else:
+                print(f"\nScanned repository {full_repo_name} locally: {len(repo_matches)} matches.")
+                results = group_by_value(repo_matches, specific_values)
+                store.save(full_repo_name, record['pushed_at'], head, results)
+            yield full_repo_name, ordered_matches(results, specific_values)
+    print(f'\nScanned {repo_count} repositories.')
 
 def main():
     parser = argparse.ArgumentParser(description='Scan all repositories under a GitHub organization and search for specific values.')
-    parser.add_argument('-o', '--organization', required=True, help='GitHub organization name')
+    add_discovery_arguments(parser, '-o', '--organization', required=True, org_help='GitHub organization name')
     parser.add_argument('-v', '--values', required=True, nargs='+', help='Specific values to search for (enclose phrases in quotes)')
     parser.add_argument('-t', '--token', help='GitHub access token (required for private repos or higher rate limits)')
-    
+    parser.add_argument('--org-search', action='store_true', help='Search the whole organization with org: scoped queries, packing several values into one OR query')
+    parser.add_argument('--backend', choices=['api', 'local'], default='api', help='api uses the code search API; local scans shallow clones (or existing mirrors) with no search quota')
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR, help='Directory holding the clones and mirrors of the local backend')
+    parser.add_argument('--max-file-size', type=int, default=DEFAULT_MAX_FILE_SIZE, help='Local backend: skip files larger than this many bytes')
+    parser.add_argument('--jobs', type=int, help='Local backend: number of matching processes (defaults to the CPU count)')
+    parser.add_argument('--case-sensitive', action='store_true', help='Local backend: match values case-sensitively (the search API ignores case)')
+    parser.add_argument('--history', action='store_true', help='Local backend: scan every blob in the history of full mirrors, reporting the commit that introduced each match')
+    parser.add_argument('--state-dir', default=DEFAULT_STATE_DIR, help='Directory holding the per-repository scan state used for incremental rescans')
+    parser.add_argument('--full-rescan', action='store_true', help='Ignore the stored scan state and scan every repository for every value')
+    parser.add_argument('--output', default=DEFAULT_MATCHES_FILE, help='File the matches are streamed to as they are found (.jsonl or .csv)')
+    parser.add_argument('--summary', default=DEFAULT_SUMMARY_FILE, help='CSV file receiving the number of matches per repository and value')
+
     args = parser.parse_args()
 
-    org_name = args.organization
+    org_name = args.org
     specific_values = args.values
     access_token = args.token
 
@@ -21,86 +326,43 @@ def main():
     if access_token:
         headers['Authorization'] = f'token {access_token}'
 
-    # Fetch the list of repositories in the organization
-    repos = []
-    page = 1
-    per_page = 100
-    print(f"Fetching repositories for organization '{org_name}'...")
-    while True:
-        url = f'https://api.github.com/orgs/{org_name}/repos?per_page={per_page}&page={page}'
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            print(f'Failed to fetch repositories: {response.text}')
-            sys.exit(1)
-        data = response.json()
-        if not data:
-            break
-        repos.extend(data)
-        page += 1
-
-    print(f'Found {len(repos)} repositories.')
-
-    matches = []
-
-    # For each repository
-    for repo in repos:
-        repo_name = repo['name']
-        full_repo_name = f"{org_name}/{repo_name}"
-        print(f"\nSearching in repository {full_repo_name}...")
-        for value in specific_values:
-            print(f"  Searching for '{value}'...")
-            # Build the search query
-            query = f'"{value}" repo:{full_repo_name}'
-            search_url = f"https://api.github.com/search/code"
-            params = {'q': query, 'per_page': 100}
-            total_count = None
-            page = 1
-            while True:
-                params['page'] = page
-                search_response = requests.get(search_url, headers=headers, params=params)
-                if search_response.status_code == 200:
-                    search_data = search_response.json()
-                    if total_count is None:
-                        total_count = search_data.get('total_count', 0)
-                        if total_count == 0:
-                            print(f"    No matches found for '{value}' in {full_repo_name}.")
-                            break
-                        else:
-                            print(f"    Found {total_count} matches for '{value}' in {full_repo_name}.")
-                    for item in search_data.get('items', []):
-                        matches.append({
-                            'repo': full_repo_name,
-                            'file': item['path'],
-                            'value': value,
-                            'html_url': item['html_url']
-                        })
-                    # Check if there are more pages
-                    if 'next' in search_response.links:
-                        page += 1
-                        time.sleep(1)  # Sleep to respect rate limits
-                    else:
-                        break
-                elif search_response.status_code == 403:
-                    if 'Retry-After' in search_response.headers:
-                        retry_after = int(search_response.headers['Retry-After'])
-                        print(f"    Rate limit exceeded, retrying after {retry_after} seconds...")
-                        time.sleep(retry_after)
-                    else:
-                        reset_time = int(search_response.headers.get('X-RateLimit-Reset', time.time() + 60))
-                        wait_time = max(reset_time - int(time.time()), 1)
-                        print(f"    Rate limit exceeded, retrying after {wait_time} seconds...")
-                        time.sleep(wait_time)
-                else:
-                    print(f"    Failed to search code: {search_response.text}")
-                    break
+    if args.backend == 'local':
+        scope = f"local:{'case' if args.case_sensitive else 'nocase'}:{args.max_file_size}"
+        if args.history:
+            scope += ':history'
+    else:
+        scope = 'api'
+    store = ScanStateStore(args.state_dir, scope)
+
+    try:
+        print(f"Fetching repositories for organization '{org_name}'...")
+        repos = discover_repositories(args, token=access_token)
+        if args.backend == 'local':
+            results = scan_locally(args, repos, specific_values, store, args.full_rescan)
+        elif args.org_search:
+            results = scan_organization(org_name, repos, specific_values, headers, store, args.full_rescan)
+        else:
+            # Stream the repositories of the organization; pages are fetched concurrently
+            results = scan_repositories(repos, specific_values, headers, store, args.full_rescan)
+
+        # Stream the matches to the output file, flushing after each repository (or each --org-search hit)
+        with MatchWriter(args.output, args.summary) as writer:
+            for _, repo_matches in results:
+                for match in repo_matches:
+                    writer.write(match)
+                    print(f"Repository: {match['repo']}, File: {match['file']}, Value: {match['value']}, URL: {match['html_url']}")
+                writer.end_repository()
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
 
     # Report matches
-    if matches:
-        print('\nSearch complete. Matches found:')
-        for match in matches:
-            print(f"Repository: {match['repo']}, File: {match['file']}, Value: {match['value']}, URL: {match['html_url']}")
+    total = sum(writer.counts.values())
+    if total:
+        print(f'\nSearch complete. {total} matches found in {len({repo for repo, _ in writer.counts})} repositories.')
     else:
         print('\nSearch complete. No matches found.')
+    print(f"Matches written to {args.output}, summary written to {args.summary}.")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import Future
+
+class GithubMemo:
+    """Run-scoped, single-flight memo for repository, contents, tree and branch lookups.
+
+    Every lookup is keyed by repository (and path/ref where relevant). The first
+    caller for a key performs the request; concurrent callers asking for the
+    same key wait on that in-flight request instead of issuing their own, so no
+    resource is fetched twice per run. "Not found" answers are remembered as
+    well, while other errors are dropped from the memo so a later caller can
+    retry them.
+    """
+
+    def __init__(self, github):
+        self._github = github
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def _once(self, key, fetch):
+        with self._lock:
+            future = self._entries.get(key)
+            owner = future is None
+            if owner:
+                future = self._entries[key] = Future()
+
+        if owner:
+            try:
+                future.set_result(fetch())
+            except Exception as e:
+                if getattr(e, 'status', None) != 404:
+                    with self._lock:
+                        del self._entries[key]
+                future.set_exception(e)
+        return future.result()
+
+    def _handle(self, repo_name):
+        # Lazy repository objects don't hit the API until an attribute is read
+        return self._github.get_repo(repo_name, lazy=True)
+
+    def get_repo(self, repo_name):
+        """Return the fully fetched repository object."""
+        return self._once(('repo', repo_name), lambda: self._github.get_repo(repo_name))
+
+    def get_contents(self, repo_name, path="", ref=None):
+        """Return the contents of `path` in the repository, optionally at `ref`."""
+        def fetch():
+            handle = self._handle(repo_name)
+            if ref is None:
+                return handle.get_contents(path)
+            return handle.get_contents(path, ref=ref)
+        return self._once(('contents', repo_name, path, ref), fetch)
+
+    def get_tree(self, repo_name, ref):
+        """Return the full recursive git tree of the repository at `ref`."""
+        return self._once(('tree', repo_name, ref), lambda: self._handle(repo_name).get_git_tree(ref, recursive=True))
+
+    def get_branch(self, repo_name, branch):
+        """Return a single branch, including its head commit and root tree SHA."""
+        return self._once(('branch', repo_name, branch), lambda: self._handle(repo_name).get_branch(branch))
+
+    def get_branches(self, repo_name):
+        """Return the list of branches of the repository."""
+        return self._once(('branches', repo_name), lambda: list(self._handle(repo_name).get_branches()))
@@ -0,0 +1,188 @@
+import re
+from collections import namedtuple
+
+# Bump whenever the rows produced for the same source change, to invalidate parse caches
+PARSER_VERSION = 1
+
+# One attribute of a Terraform/HCL file. `type` and `name` identify the
+# top-level block (None for top-level attributes, as in .tfvars files),
+# `attribute` is dotted through nested blocks ("lifecycle.prevent_destroy"),
+# and `value` is the source text of the expression, found at bytes
+# [start, end) of the file.
+HclValue = namedtuple('HclValue', ['type', 'name', 'attribute', 'value', 'start', 'end'])
+
+_TOKEN = re.compile(rb'''
+    (?P<space>[ \t\r\f\v]+)
+  | (?P<newline>\n)
+  | (?P<comment>(?:\#|//)[^\n]*|/\*.*?\*/)
+  | (?P<heredoc><<-?(?P<marker>[A-Za-z_][\w-]*)[ \t]*\r?\n)
+  | (?P<string>")
+  | (?P<ident>[A-Za-z_][\w-]*)
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<equals>=(?![=>]))
+  | (?P<open>[{\[(])
+  | (?P<close>[}\])])
+  | (?P<other>==|!=|<=|>=|&&|\|\||=>|\.\.\.|\S)
+''', re.VERBOSE | re.DOTALL)
+
+# Characters that need attention inside a quoted string: its end, escapes, and template sequences
+_STRING_SPECIAL = re.compile(rb'"|\\.|[$%]{2}\{|[$%]\{|\n', re.DOTALL)
+
+def _string_end(data, pos):
+    """Return the offset just past the closing quote of the string whose body starts at `pos`."""
+    while True:
+        match = _STRING_SPECIAL.search(data, pos)
+        if match is None:
+            return len(data)
+        special = match.group()
+        if special == b'"':
+            return match.end()
+        if special == b'\n':
+            # Quoted strings can't span lines: recover at the end of the line
+            return match.start()
+        if special in (b'${', b'%{'):
+            pos = _template_end(data, match.end())
+        else:
+            # An escape, or an escaped "$${"/"%%{" sequence
+            pos = match.end()
+
+def _template_end(data, pos):
+    """Return the offset just past the "}" closing the template sequence whose body starts at `pos`."""
+    depth = 0
+    while pos < len(data):
+        match = _TOKEN.match(data, pos)
+        kind = match.lastgroup
+        if kind == 'string':
+            pos = _string_end(data, match.end())
+            continue
+        pos = match.end()
+        if kind == 'open':
+            depth += 1
+        elif kind == 'close':
+            if depth == 0:
+                return pos
+            depth -= 1
+    return pos
+
+def _heredoc_end(data, pos, marker):
+    """Return the offset just past the line closing a heredoc whose body starts at `pos`."""
+    closing = re.compile(rb'^[ \t]*' + re.escape(marker) + rb'[ \t]*\r?$', re.MULTILINE)
+    match = closing.search(data, pos)
+    return match.end() if match else len(data)
+
+def tokenize(data):
+    """Yield (kind, start, end) for the significant tokens of HCL source bytes.
+
+    Whitespace and comments are dropped; newlines are kept because they end
+    attributes. Strings (including nested template expressions) and heredocs
+    are returned as single tokens, so a "#" or "}" inside them is never
+    mistaken for a comment or a block end. Each byte is examined once.
+    """
+    pos = 0
+    length = len(data)
+    while pos < length:
+        match = _TOKEN.match(data, pos)
+        kind = match.lastgroup
+        if kind == 'string':
+            end = _string_end(data, match.end())
+        elif kind == 'heredoc':
+            end = _heredoc_end(data, match.end(), match.group('marker'))
+        else:
+            end = match.end()
+        if kind not in ('space', 'comment'):
+            yield kind, pos, end
+        pos = end
+
+def _label(data, kind, start, end):
+    text = data[start:end].decode('utf-8', 'replace')
+    return text[1:-1] if kind == 'string' else text
+
+def parse_hcl(data, blocks=None):
+    """Return the HclValue rows of HCL source (bytes or str), in source order.
+
+    Nested blocks (lifecycle, dynamic, provisioners...) are walked to any
+    depth, and an attribute value runs to the end of its line unless
+    brackets keep it open, so multi-line lists, maps and function calls are
+    captured whole. Runs in time linear in the size of the source.
+
+    A block without attributes gives no rows; to see every block, pass a
+    list as `blocks` to receive a (type, name, start, end) tuple per
+    top-level block, spanning its header (`variable "region"`).
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    tokens = list(tokenize(data))
+    rows = []
+    # One entry per open block: (top-level type, top-level name, attribute path prefix)
+    stack = []
+    count = len(tokens)
+    i = 0
+    while i < count:
+        kind, start, end = tokens[i]
+        if kind == 'newline':
+            i += 1
+            continue
+        if kind == 'close':
+            if stack:
+                stack.pop()
+            i += 1
+            continue
+        if kind != 'ident':
+            # Not a statement: skip to the end of the line
+            while i < count and tokens[i][0] != 'newline':
+                i += 1
+            continue
+
+        identifier = data[start:end].decode('utf-8', 'replace')
+        i += 1
+        if i < count and tokens[i][0] == 'equals':
+            value_start = value_end = tokens[i][2]
+            i += 1
+            depth = 0
+            first = True
+            while i < count:
+                token_kind, token_start, token_end = tokens[i]
+                if depth == 0 and (token_kind == 'newline' or token_kind == 'close'):
+                    break
+                if token_kind == 'open':
+                    depth += 1
+                elif token_kind == 'close':
+                    depth -= 1
+                if token_kind != 'newline':
+                    if first:
+                        value_start = token_start
+                        first = False
+                    value_end = token_end
+                i += 1
+            value = data[value_start:value_end].decode('utf-8', 'replace')
+            if stack:
+                block_type, block_name, prefix = stack[-1]
+                rows.append(HclValue(block_type, block_name, prefix + identifier, value, value_start, value_end))
+            else:
+                rows.append(HclValue(None, None, identifier, value, value_start, value_end))
+            continue
+
+        labels = []
+        header_end = end
+        while i < count and tokens[i][0] in ('string', 'ident'):
+            labels.append(_label(data, *tokens[i]))
+            header_end = tokens[i][2]
+            i += 1
+        if i < count and tokens[i][0] == 'open' and data[tokens[i][1]:tokens[i][2]] == b'{':
+            if stack:
+                block_type, block_name, prefix = stack[-1]
+                stack.append((block_type, block_name, prefix + '.'.join([identifier] + labels) + '.'))
+            else:
+                stack.append((identifier, '/'.join(labels), ''))
+                if blocks is not None:
+                    blocks.append((identifier, '/'.join(labels), start, header_end))
+            i += 1
+            continue
+        while i < count and tokens[i][0] != 'newline':
+            i += 1
+    return rows
+
+def parse_hcl_file(file_path):
+    """Parse a .tf or .tfvars file and return its HclValue rows."""
+    with open(file_path, 'rb') as file:
+        return parse_hcl(file.read())
@@ -0,0 +1,269 @@
+import hashlib
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from git_utils import ensure_repository, iter_blobs, iter_history, large_blobs, ls_tree, rev_parse, run_git
+
+# Local clones and mirrors scanned by the local backend
+DEFAULT_WORKDIR = "scan_mirrors"
+
+# Blobs larger than this are skipped, like the search API skips large files
+DEFAULT_MAX_FILE_SIZE = 5 * 1024 * 1024
+
+# Amount of blob content sent to a worker process in one task
+CHUNK_BYTES = 8 * 1024 * 1024
+
+# Number of repositories cloned or fetched ahead of the one being scanned
+CLONE_CONCURRENCY = 4
+
+# A NUL byte in the first few KB marks a file as binary, as git itself does
+BINARY_SNIFF_BYTES = 8000
+
+def repository_path(workdir, full_repo_name):
+    """Local path of the clone or mirror of a repository under `workdir`."""
+    return os.path.join(workdir, *full_repo_name.split('/')) + '.git'
+
+class MultiPatternMatcher:
+    """Find which of many values occur in a file in a single pass (Aho-Corasick).
+
+    All values are compiled into one automaton, so each byte of a file is
+    examined once however many values there are, and overlapping values (one
+    contained in another) are all reported. A single compiled regex alternation
+    runs first as a prefilter at C speed: files without any value are rejected
+    without entering the automaton, and for the others the automaton starts at
+    the first possible match.
+    """
+
+    def __init__(self, values, ignore_case=True):
+        self.values = list(dict.fromkeys(values))
+        self.ignore_case = ignore_case
+        patterns = [self._normalize(value.encode('utf-8')) for value in self.values]
+        self._prefilter = re.compile(b'|'.join(re.escape(p) for p in sorted(patterns, key=len, reverse=True)))
+
+        # goto[state] maps a byte to the next state; out[state] holds the indices of the values ending there
+        self._goto = [{}]
+        self._out = [set()]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for byte in pattern:
+                next_state = self._goto[state].get(byte)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][byte] = next_state
+                    self._goto.append({})
+                    self._out.append(set())
+                state = next_state
+            self._out[state].add(index)
+
+        # Breadth-first construction of the failure links
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for byte, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and byte not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(byte, 0)
+                self._out[next_state] |= self._out[self._fail[next_state]]
+
+    def _normalize(self, data):
+        return data.lower() if self.ignore_case else data
+
+    def find(self, data):
+        """Return the values occurring in `data` (bytes), in the order they were given."""
+        data = self._normalize(data)
+        first = self._prefilter.search(data)
+        if first is None:
+            return []
+
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for byte in memoryview(data)[first.start():]:
+            while state and byte not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(byte, 0)
+            if out[state]:
+                found |= out[state]
+                if len(found) == len(self.values):
+                    break
+        return [self.values[index] for index in sorted(found)]
+
+def is_binary(data):
+    """Tell whether blob content looks binary."""
+    return b'\0' in data[:BINARY_SNIFF_BYTES]
+
+_worker_matcher = None
+
+def _init_worker(values, ignore_case):
+    global _worker_matcher
+    _worker_matcher = MultiPatternMatcher(values, ignore_case)
+
+def _scan_chunk(chunk):
+    """Worker task: return [(blob sha, [values])] for the blobs of a chunk that contain any value."""
+    results = []
+    for sha, data in chunk:
+        if is_binary(data):
+            continue
+        values = _worker_matcher.find(data)
+        if values:
+            results.append((sha, values))
+    return results
+
+class LocalScanner:
+    """Scan repositories from local clones instead of the code search API.
+
+    Each repository is shallow-cloned (or an existing mirror is reused) under
+    `workdir`. The files of the default branch are read straight from the
+    object database, and each unique blob is matched against all values by a
+    process pool. Binary and oversized blobs are skipped. Matches are returned
+    in the same records as the API scanner.
+
+    With `history`, every repository is kept as a full mirror and every blob
+    reachable from any ref is scanned instead: each match is reported with
+    the first commit and path that introduced the blob. Blobs are keyed by SHA
+    across the whole batch, so a blob shared by many commits, forks or
+    repositories is read and matched only once.
+    """
+
+    def __init__(self, values, workdir=DEFAULT_WORKDIR, token=None, max_file_size=DEFAULT_MAX_FILE_SIZE,
+                 jobs=None, ignore_case=True, history=False):
+        self.values = values
+        self.workdir = workdir
+        self.token = token
+        self.max_file_size = max_file_size
+        self.jobs = jobs or os.cpu_count() or 1
+        self.ignore_case = ignore_case
+        self.history = history
+        self._executor = None
+        # History mode: blobs already matched in this batch, and the values found in those that matched
+        self._scanned_blobs = set()
+        self._blob_values = {}
+
+    def __enter__(self):
+        self._executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                             initargs=(self.values, self.ignore_case))
+        # Fork the workers now, before scan_repositories starts its clone threads
+        self._executor.submit(os.getpid).result()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._executor.shutdown()
+        self._executor = None
+
+    def update(self, full_repo_name):
+        """Clone or update a repository and return (local path, head SHA).
+
+        In history mode any ref moving changes what must be scanned, so the
+        "head" is a digest of all the refs of the mirror instead.
+        """
+        path = ensure_repository(full_repo_name, repository_path(self.workdir, full_repo_name), token=self.token,
+                                 mirror=self.history)
+        if self.history:
+            return path, hashlib.sha1(run_git(['show-ref'], cwd=path)).hexdigest()
+        return path, rev_parse(path)
+
+    def _chunks(self, path, shas):
+        chunk, chunk_bytes = [], 0
+        for sha, data in iter_blobs(path, shas):
+            chunk.append((sha, data))
+            chunk_bytes += len(data)
+            if chunk_bytes >= CHUNK_BYTES:
+                yield chunk
+                chunk, chunk_bytes = [], 0
+        if chunk:
+            yield chunk
+
+    def scan_blobs(self, path, shas):
+        """Yield (blob sha, [values]) for the given blobs, matched across the process pool."""
+        pending = deque()
+        for chunk in self._chunks(path, shas):
+            pending.append(self._executor.submit(_scan_chunk, chunk))
+            # Keep a bounded number of chunks in flight so memory stays flat
+            if len(pending) >= self.jobs * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+    def scan_repository(self, full_repo_name, path=None, head=None):
+        """Yield the match records of the default branch of a repository."""
+        if path is None:
+            path, head = self.update(full_repo_name)
+        if self.history:
+            yield from self.scan_history(full_repo_name, path)
+            return
+
+        # Identical files share a blob, so every unique blob is scanned once
+        paths_by_blob = {}
+        for sha, size, file_path in ls_tree(path, head):
+            if size <= self.max_file_size:
+                paths_by_blob.setdefault(sha, []).append(file_path)
+
+        for sha, values in self.scan_blobs(path, list(paths_by_blob)):
+            for file_path in paths_by_blob[sha]:
+                for value in values:
+                    yield {
+                        'repo': full_repo_name,
+                        'file': file_path,
+                        'value': value,
+                        'html_url': f"https://github.com/{full_repo_name}/blob/{head}/{file_path}"
+                    }
+
+    def scan_history(self, full_repo_name, path):
+        """Yield the match records of every blob reachable in the history of a mirror."""
+        large = large_blobs(path, self.max_file_size)
+        first_seen = {}
+        for commit, sha, file_path in iter_history(path):
+            if sha not in first_seen and sha not in large:
+                first_seen[sha] = (commit, file_path)
+
+        new_shas = [sha for sha in first_seen if sha not in self._scanned_blobs]
+        for sha, values in self.scan_blobs(path, new_shas):
+            self._blob_values[sha] = values
+        self._scanned_blobs.update(new_shas)
+
+        for sha, (commit, file_path) in first_seen.items():
+            for value in self._blob_values.get(sha, ()):
+                yield {
+                    'repo': full_repo_name,
+                    'file': file_path,
+                    'value': value,
+                    'html_url': f"https://github.com/{full_repo_name}/blob/{commit}/{file_path}",
+                    'commit': commit
+                }
+
+    def scan_repositories(self, repo_names, needs_update=None, needs_scan=None):
+        """Yield (repo name, head SHA, result) for each repository, in order.
+
+        The result is the list of match records, the RuntimeError that stopped
+        the repository, or None when the repository was skipped: either
+        `needs_update(repo name)` said it needs no fetch at all (the head SHA
+        is then None too), or `needs_scan(repo name, head SHA)` said the freshly
+        fetched head needs no scan. Clones and fetches of the next repositories
+        run in background threads while the current one is being scanned.
+        """
+        with ThreadPoolExecutor(max_workers=CLONE_CONCURRENCY) as cloner:
+            pending = deque()
+
+            def result(name, future):
+                if future is None:
+                    return name, None, None
+                try:
+                    path, head = future.result()
+                    if needs_scan is not None and not needs_scan(name, head):
+                        return name, head, None
+                    return name, head, list(self.scan_repository(name, path, head))
+                except RuntimeError as e:
+                    return name, None, e
+
+            for name in repo_names:
+                update = needs_update is None or needs_update(name)
+                pending.append((name, cloner.submit(self.update, name) if update else None))
+                if len(pending) > CLONE_CONCURRENCY:
+                    yield result(*pending.popleft())
+            while pending:
+                yield result(*pending.popleft())
@@ -0,0 +1,61 @@
+import csv
+import json
+
+# Columns of the CSV output, in the order of the match records ('commit' is only set by history scans)
+MATCH_FIELDS = ['repo', 'file', 'value', 'html_url', 'commit']
+
+DEFAULT_MATCHES_FILE = "scan_matches.jsonl"
+DEFAULT_SUMMARY_FILE = "scan_summary.csv"
+
+class MatchWriter:
+    """Stream scanner matches to a JSONL or CSV file as they arrive.
+
+    The format follows the file extension (.csv for CSV, JSONL otherwise).
+    Callers mark the end of each repository with `end_repository`, which
+    flushes the output, so a crash loses at most the repository in progress
+    and another process can tail the file while the scan runs. Only the per
+    repository x value counts are kept in memory, for the summary written by
+    `close`.
+    """
+
+    def __init__(self, path, summary_path=None):
+        self.path = path
+        self.summary_path = summary_path
+        self.counts = {}
+        self._file = open(path, 'w', newline='')
+        if path.lower().endswith('.csv'):
+            self._csv = csv.DictWriter(self._file, fieldnames=MATCH_FIELDS, extrasaction='ignore')
+            self._csv.writeheader()
+        else:
+            self._csv = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, match):
+        """Write one match record."""
+        if self._csv is not None:
+            self._csv.writerow(match)
+        else:
+            self._file.write(json.dumps({field: match[field] for field in MATCH_FIELDS if field in match}) + '\n')
+        key = (match['repo'], match['value'])
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def end_repository(self):
+        """Flush the matches written so far; called once a repository is done, whether or not it had matches."""
+        self._file.flush()
+
+    def close(self):
+        """Flush the matches and write the summary of counts per repository and value."""
+        if self._file.closed:
+            return
+        self._file.close()
+        if self.summary_path:
+            with open(self.summary_path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(['repo', 'value', 'matches'])
+                for (repo, value), count in sorted(self.counts.items()):
+                    writer.writerow([repo, value, count])
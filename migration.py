@@ -5,6 +5,10 @@ import stat
 from github import Github
 import csv
 import time
+import argparse
+from github_memo import GithubMemo
+from repo_discovery import add_discovery_arguments, discover_repositories
+from build_detector import BuildSystemMatcher, BuildDetectionCache, detect_build_systems, format_build_systems, format_build_files
 
 # GitHub Personal Access Token from environment variable
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
@@ -15,6 +19,9 @@ if not GITHUB_TOKEN:
 # Initialize GitHub connection
 g = Github(GITHUB_TOKEN)
 
+# Run-scoped memo so each repository, contents and branch lookup is fetched once
+memo = GithubMemo(g)
+
 # Organization name where the repositories should be created
 ORG_NAME = "capgemini-cg-demo"
 
@@ -26,29 +33,11 @@ CI_TEMPLATE_PATH = "templates"
 # File to store target repository URLs in org/repo format
 target_repos_file = "target_repos.csv"
 
-# Build system file indicators
-build_systems = {
-    'maven': 'pom.xml',
-    'gradle': 'build.gradle',
-    'npm': 'package.json',
-    'yarn': 'yarn.lock',
-    'make': 'Makefile',
-    'cmake': 'CMakeLists.txt',
-    'bazel': 'BUILD',
-    'go': 'go.mod',
-    'rust': 'Cargo.toml',
-    'python_setuptools': 'setup.py',
-    'python_pip': 'requirements.txt',
-    'python_pyproject': 'pyproject.toml',
-    'ruby_bundler': 'Gemfile',
-    'ruby_gem': '.gemspec',
-    'dotNET_CS': '.csproj',
-    'dotNET_VB': '.vbproj',
-    'dotNET_FS': '.fsproj',
-    'dotNET_Solution': '.sln',
-    'dotNET_SDK': 'global.json',
-    'dotNET_NuGet': 'packages.config'
-}
+# Classifies with the shared indicator table of build_detector.py; every system is reported
+build_matcher = BuildSystemMatcher()
+
+# Build-detection results shared across scripts and runs, keyed by tree SHA
+build_cache = BuildDetectionCache()
 
 # CSV file path
 csv_file_path = "migration_summary.csv"
@@ -65,25 +54,18 @@ def print_separator_with_repo_name(repo_name, phase="Starting migration"):
     print(f"\n{'=' * left_equals}{repo_display}{'=' * right_equals}\n")
 
 def detect_language_and_build_system(repo_name):
-    """Detect the primary language and the build system used in a GitHub repository."""
+    """Detect the primary language and the build systems used in a GitHub repository, with the paths of their build files."""
     try:
-        repo = g.get_repo(repo_name)
+        repo = memo.get_repo(repo_name)
         primary_language = repo.language
 
-        contents = repo.get_contents("")
-        repo_files = [content.path for content in contents]
-        
-        detected_build_systems = []
-        for build_system, indicator_file in build_systems.items():
-            if any(indicator_file in file for file in repo_files):
-                detected_build_systems.append(build_system)
-        
-        build_systems_detected = ', '.join(detected_build_systems) if detected_build_systems else "No common build system detected."
-
-        return primary_language, build_systems_detected
+        found = detect_build_systems(memo, repo_name, build_matcher, cache=build_cache)
+        build_systems_detected = format_build_systems(found)
+
+        return primary_language, build_systems_detected, format_build_files(found)
     except Exception as e:
         print(f"Error fetching repository data for {repo_name}: {e}")
-        return None, None
+        return None, None, None
 
 def load_repositories_from_file(file_path):
     """Read repository names from a file."""
@@ -97,11 +79,10 @@ def load_repositories_from_file(file_path):
 def fetch_ci_file_from_github(build_system):
     """Fetch the CI template from the Centralized Workflow repository."""
     try:
-        repo = g.get_repo(CI_TEMPLATE_REPO)
         ci_file_path = f"{CI_TEMPLATE_PATH}/{build_system}-ci.yml"
 
         # Fetch the content if the file exists
-        ci_file = repo.get_contents(ci_file_path, ref=CI_TEMPLATE_BRANCH)
+        ci_file = memo.get_contents(CI_TEMPLATE_REPO, ci_file_path, ref=CI_TEMPLATE_BRANCH)
         return ci_file.decoded_content.decode('utf-8')
     
     except Exception as e:
@@ -188,9 +169,16 @@ def cleanup_directory(directory_path):
         print(f"  - Error cleaning up {directory_path}: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f'Migrate repositories into the {ORG_NAME} organization.')
+    add_discovery_arguments(parser)
+    args = parser.parse_args()
+
     file_path = "source_repos.csv"
-    
-    repos = load_repositories_from_file(file_path)
+
+    if args.org:
+        repos = [record['full_name'] for record in discover_repositories(args, token=GITHUB_TOKEN)]
+    else:
+        repos = load_repositories_from_file(file_path)
     
     if not repos:
         print("No repositories found in the file.")
@@ -198,13 +186,15 @@ if __name__ == "__main__":
         for repo_name in repos:
             print_separator_with_repo_name(repo_name, phase="Starting migration")
 
-            primary_language, build_system = detect_language_and_build_system(repo_name)
+            primary_language, build_system, build_files = detect_language_and_build_system(repo_name)
             if primary_language and build_system:
                 print(f"Repository: {repo_name}")
                 print(f"  - Primary Language: {primary_language}")
                 print(f"  - Build System(s): {build_system}")
+                if build_files:
+                    print(f"  - Build File(s): {build_files}")
                 
-                source_repo = g.get_repo(repo_name)
+                source_repo = memo.get_repo(repo_name)
 
                 build_system_list = build_system.split(', ')  
                 ci_found = False
@@ -1,8 +1,12 @@
 import os
+import sys
 import requests
 import csv
 import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from async_collector import Collector
+
 def get_java_build_tool(file):
     if file['name'].endswith('pom.xml'):
         return 'maven'
@@ -64,19 +68,23 @@ def print_statements_to_file(repo, language, api_language, branch_count, repo_si
 
     return
 
-def get_repo_info(repo):
+async def get_repo_info(collector, repo):
+    # languages, repo data and branches are independent, so fetch them concurrently
+    languages_response, repo_response, branches_response = await collector.gather(
+        lambda: requests.get(api_url + repo + '/languages', headers={'Authorization': access_token}),
+        lambda: requests.get(api_url + repo, headers={'Authorization': access_token}),
+        lambda: requests.get(api_url + repo + '/branches', headers={'Authorization': access_token}),
+    )
+
     # find major language
-    response = requests.get(api_url + repo + '/languages', headers={'Authorization': access_token})
-    
-    languages_data = response.json()
+    languages_data = languages_response.json()
     if isinstance(languages_data, dict):
         language = max(languages_data, key=languages_data.get)
     else:
         print(f"Unexpected format for languages data in repo: {repo}")
         return
-    
-    response = requests.get(api_url + repo, headers={'Authorization': access_token})
-    repo_data = response.json()
+
+    repo_data = repo_response.json()
 
     # Check if the response is a dictionary (valid) and get the repo size
     if isinstance(repo_data, dict):
@@ -85,10 +93,9 @@ def get_repo_info(repo):
     else:
         print(f"Unexpected format for repo data in repo: {repo}")
         return
-    
+
     # find branch count
-    response = requests.get(api_url + repo + '/branches', headers={'Authorization': access_token})
-    branches_data = response.json()
+    branches_data = branches_response.json()
 
     if isinstance(branches_data, list):
         branch_count = len(branches_data)
@@ -100,10 +107,14 @@ def get_repo_info(repo):
     # find build tool
     build_tool = None
     if language.lower() == 'java' or language.lower() == 'javascript':
-        build_tool = get_build_tool(repo, language.lower())
-    
-    print_statements_to_file(repo, language, api_language, branch_count, repo_size, branch_names, build_tool)
-    return
+        build_tool = await collector.call(get_build_tool, repo, language.lower())
+
+    return language, api_language, branch_count, repo_size, branch_names, build_tool
+
+def record_repo_info(repo, info):
+    # results arrive in input order, so the logs and summary keep the repos.txt order
+    if info is not None:
+        print_statements_to_file(repo, *info)
 
 
 def main():
@@ -124,9 +135,10 @@ def main():
         file.write(f'\nStart time {ct_start}\n\n')
 
     with open('repos.txt', mode='r') as file:
-        for line in file:
-            repo = line.strip()  # Use line.strip() to get owner/repo format
-            get_repo_info(repo)
+        repos = [line.strip() for line in file if line.strip()]  # Use line.strip() to get owner/repo format
+
+    collector = Collector()
+    collector.run(repos, lambda repo: get_repo_info(collector, repo), record_repo_info)
 
     ct_end = datetime.datetime.now()
     print(f'\nEnd time {ct_end}')
@@ -1,11 +1,33 @@
 import os
 import csv
+import argparse
+import asyncio
+import datetime
+import time
 from github import Github
+from async_collector import Collector, DEFAULT_CONCURRENCY
+from github_memo import GithubMemo
+from git_utils import github_url, ls_remote
+from repo_discovery import add_discovery_arguments, discover_repositories
+from summary_csv import open_summary
+from build_detector import BuildSystemMatcher, BuildDetectionCache, detect_build_systems, format_build_systems, format_build_files
 
 # Input CSV files
 source_repos_csv = "source_repos.csv"
 target_repos_csv = "target_repos.csv"
 post_migration_summary_csv = "post_migration_summary.csv"
+pre_migration_summary_csv = "pre_migration_summary.csv"
+ref_verification_csv = "ref_verification_summary.csv"
+
+# Snapshots older than this are re-fetched live from the source repository
+DEFAULT_MAX_SNAPSHOT_AGE_HOURS = 24
+
+# GitHub computes size and language lazily after a push; targets pushed within
+# this window get their size/language differences re-checked with backoff
+FRESH_PUSH_WINDOW = datetime.timedelta(hours=1)
+RECHECK_INITIAL_DELAY = 15  # seconds
+RECHECK_MAX_DELAY = 240  # seconds
+DEFAULT_RECHECK_DEADLINE_MINUTES = 15
 
 # GitHub connection
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
@@ -13,29 +35,14 @@ if not GITHUB_TOKEN:
     raise ValueError("GITHUB_TOKEN environment variable not set.")
 g = Github(GITHUB_TOKEN)
 
-# Build system file indicators
-build_systems = {
-    'maven': 'pom.xml',
-    'gradle': 'build.gradle',
-    'npm': 'package.json',
-    'yarn': 'yarn.lock',
-    'make': 'Makefile',
-    'cmake': 'CMakeLists.txt',
-    'bazel': 'BUILD',
-    'go': 'go.mod',
-    'rust': 'Cargo.toml',
-    'python_setuptools': 'setup.py',
-    'python_pip': 'requirements.txt',
-    'python_pyproject': 'pyproject.toml',
-    'ruby_bundler': 'Gemfile',
-    'ruby_gem': '.gemspec',
-    'dotNET_CS': '.csproj',
-    'dotNET_VB': '.vbproj',
-    'dotNET_FS': '.fsproj',
-    'dotNET_Solution': '.sln',
-    'dotNET_SDK': 'global.json',
-    'dotNET_NuGet': 'packages.config'
-}
+# Run-scoped memo so each repository, contents and branch lookup is fetched once
+memo = GithubMemo(g)
+
+# Classifies with the shared indicator table of build_detector.py; every system is reported
+build_matcher = BuildSystemMatcher()
+
+# Build-detection results shared across scripts and runs, keyed by tree SHA
+build_cache = BuildDetectionCache()
 
 def load_repositories_from_csv(file_path):
     """Read repository names from a CSV file."""
@@ -45,91 +52,314 @@ def load_repositories_from_csv(file_path):
         repos = [row[0].strip() for row in reader if row]
     return repos
 
-def detect_build_system(repo):
-    """Detect the build system used in a GitHub repository."""
+def detect_build_system(repo_name):
+    """Detect the build systems used in a GitHub repository and where their files live."""
     try:
-        contents = repo.get_contents("")
-        repo_files = [content.path for content in contents]
-
-        detected_build_systems = []
-        for build_system, indicator_file in build_systems.items():
-            if any(indicator_file in file for file in repo_files):
-                detected_build_systems.append(build_system)
-
-        build_systems_detected = ', '.join(detected_build_systems) if detected_build_systems else "No common build system detected."
-        return build_systems_detected
+        found = detect_build_systems(memo, repo_name, build_matcher, cache=build_cache)
+        return format_build_systems(found), format_build_files(found)
     except Exception as e:
-        print(f"Error detecting build system for repository {repo.full_name}: {e}")
-        return "Error detecting build system"
+        print(f"Error detecting build system for repository {repo_name}: {e}")
+        return "Error detecting build system", ""
 
-def get_repo_details(repo_name):
-    """Fetch repository details from GitHub."""
+async def get_repo_details(collector, repo_name):
+    """Fetch repository details from GitHub, overlapping the independent reads."""
     try:
-        repo = g.get_repo(repo_name)
+        repo, branches, (build_system, build_files) = await collector.gather(
+            lambda: memo.get_repo(repo_name),
+            lambda: memo.get_branches(repo_name),
+            lambda: detect_build_system(repo_name),
+        )
         primary_language = repo.language
         repo_size = repo.size  # Size in KB
-        branches = [branch.name for branch in repo.get_branches()]
+        branches = [branch.name for branch in branches]
         branch_count = len(branches)
-        build_system = detect_build_system(repo)
         return {
             'repo_name': repo_name,
             'primary_language': primary_language,
             'branch_count': branch_count,
             'repo_size': repo_size,
             'branches': ', '.join(branches),
-            'build_system': build_system
+            'build_system': build_system,
+            'build_files': build_files,
+            'pushed_at': repo.pushed_at
         }
     except Exception as e:
         print(f"Error fetching details for repository {repo_name}: {e}")
         return None
 
-def log_post_migration_summary(source_repo, target_repo, source_details, target_details):
-    """Log post-migration details to post_migration_summary.csv."""
-    with open(post_migration_summary_csv, mode='a', newline='') as file:
-        fieldnames = ['source_repo', 'target_repo', 'source_primary_language', 'target_primary_language',
-                      'source_branch_count', 'target_branch_count', 'source_repo_size', 'target_repo_size',
-                      'source_branches', 'target_branches', 'source_build_system', 'target_build_system', 'status']
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-
-        if file.tell() == 0:  # Write header only if file is empty
-            writer.writeheader()
-
-        status = "Match" if source_details['branch_count'] == target_details['branch_count'] and source_details['repo_size'] == target_details['repo_size'] else "Mismatch"
-
-        writer.writerow({
-            'source_repo': source_repo,
-            'target_repo': target_repo,
-            'source_primary_language': source_details['primary_language'],
-            'target_primary_language': target_details['primary_language'],
-            'source_branch_count': source_details['branch_count'],
-            'target_branch_count': target_details['branch_count'],
-            'source_repo_size_kb': source_details['repo_size'],
-            'target_repo_size_kb': target_details['repo_size'],
-            'source_branches': source_details['branches'],
-            'target_branches': target_details['branches'],
-            'source_build_system': source_details['build_system'],
-            'target_build_system': target_details['build_system'],
-            'status': status
-        })
+# Columns of post_migration_summary.csv
+post_migration_fieldnames = ['source_repo', 'target_repo', 'source_primary_language', 'target_primary_language',
+                             'source_branch_count', 'target_branch_count', 'source_repo_size', 'target_repo_size',
+                             'source_branches', 'target_branches', 'source_build_system', 'target_build_system', 'status',
+                             'source_build_files', 'target_build_files']
+
+def open_post_migration_summary():
+    """Open post_migration_summary.csv once for the whole run (see summary_csv.open_summary)."""
+    return open_summary(post_migration_summary_csv, post_migration_fieldnames)
+
+def log_post_migration_summary(writer, source_repo, target_repo, source_details, target_details):
+    """Log post-migration details to post_migration_summary.csv through an open writer."""
+    status = "Match" if source_details['branch_count'] == target_details['branch_count'] and source_details['repo_size'] == target_details['repo_size'] else "Mismatch"
+
+    writer.writerow({
+        'source_repo': source_repo,
+        'target_repo': target_repo,
+        'source_primary_language': source_details['primary_language'],
+        'target_primary_language': target_details['primary_language'],
+        'source_branch_count': source_details['branch_count'],
+        'target_branch_count': target_details['branch_count'],
+        'source_repo_size': source_details['repo_size'],
+        'target_repo_size': target_details['repo_size'],
+        'source_branches': source_details['branches'],
+        'target_branches': target_details['branches'],
+        'source_build_system': source_details['build_system'],
+        'target_build_system': target_details['build_system'],
+        'status': status,
+        'source_build_files': source_details['build_files'],
+        'target_build_files': target_details['build_files']
+    })
+
+# Columns a pre-migration summary needs to serve as a snapshot (build_files is optional)
+snapshot_columns = ['repo_name', 'primary_language', 'build_system', 'branch_count', 'repo_size', 'branches', 'collected_at']
+
+def load_pre_migration_snapshot(file_path):
+    """Index pre_migration_summary.csv by repository name; the last row logged for a repo wins.
+
+    Raises ValueError when the file lacks a required column, e.g. a summary
+    written before collected_at was recorded: every repository would
+    otherwise silently fall back to a live fetch.
+    """
+    snapshot = {}
+    with open(file_path, "r", newline='') as file:
+        reader = csv.DictReader(file)
+        missing = [column for column in snapshot_columns if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{file_path} can't be used as a pre-migration snapshot: missing column(s) {', '.join(missing)}. "
+                             f"Re-run pre_migration.py to record them.")
+        for row in reader:
+            snapshot[row['repo_name']] = row
+    return snapshot
+
+def get_snapshot_details(snapshot, repo_name, max_age):
+    """Return the frozen pre-migration details of a repository.
+
+    Returns None when the repository has no snapshot, or when the snapshot has
+    no collection time or is older than `max_age`, so the caller falls back
+    to a live fetch.
+    """
+    row = snapshot.get(repo_name)
+    if row is None or not row.get('collected_at'):
+        return None
+    try:
+        collected_at = datetime.datetime.fromisoformat(row['collected_at'])
+        if datetime.datetime.now(datetime.timezone.utc) - collected_at > max_age:
+            return None
+        return {
+            'repo_name': repo_name,
+            'primary_language': row['primary_language'] or None,
+            'branch_count': int(row['branch_count']),
+            'repo_size': int(row['repo_size']),
+            'branches': row['branches'],
+            'build_system': row['build_system'],
+            'build_files': row.get('build_files') or ''
+        }
+    except (KeyError, ValueError) as e:
+        print(f"Ignoring unreadable pre-migration snapshot for {repo_name}: {e}")
+        return None
+
+def has_pending_statistics(source_details, target_details):
+    """Tell whether a size/language difference may only be GitHub's lazily computed statistics.
+
+    That is the case when the target was pushed within FRESH_PUSH_WINDOW.
+    """
+    pushed_at = target_details.get('pushed_at')
+    if pushed_at is None:
+        return False
+    if pushed_at.tzinfo is None:
+        pushed_at = pushed_at.replace(tzinfo=datetime.timezone.utc)
+    if datetime.datetime.now(datetime.timezone.utc) - pushed_at > FRESH_PUSH_WINDOW:
+        return False
+    return (source_details['repo_size'] != target_details['repo_size']
+            or source_details['primary_language'] != target_details['primary_language'])
+
+def statistics_computed(source_details, target_details):
+    """Tell whether GitHub has filled in the target's size and language."""
+    return ((target_details['repo_size'] > 0 or source_details['repo_size'] == 0)
+            and (target_details['primary_language'] is not None or source_details['primary_language'] is None))
+
+async def recheck_target(collector, source_details, target_details, deadline):
+    """Re-fetch a freshly pushed target's size and language until they settle or the deadline passes.
+
+    Checks back off exponentially and sleep without holding a collector slot,
+    so the rest of the batch keeps running. Values are settled once they match
+    the source, or once they are computed and unchanged between two checks.
+    """
+    target_repo = target_details['repo_name']
+    print(f"Size/language of {target_repo} may not be computed yet; re-checking until settled.")
+    give_up_at = time.monotonic() + deadline
+    delay = RECHECK_INITIAL_DELAY
+    previous = None
+    while has_pending_statistics(source_details, target_details):
+        remaining = give_up_at - time.monotonic()
+        if remaining <= 0:
+            print(f"Size/language of {target_repo} did not settle before the deadline.")
+            break
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, RECHECK_MAX_DELAY)
+        try:
+            # Bypass the run memo, which holds the values fetched right after the push
+            repo = await collector.call(g.get_repo, target_repo)
+        except Exception as e:
+            print(f"Error re-checking repository {target_repo}: {e}")
+            continue
+        target_details = dict(target_details, repo_size=repo.size, primary_language=repo.language)
+        observed = (repo.size, repo.language)
+        if statistics_computed(source_details, target_details) and observed == previous:
+            break
+        previous = observed
+    return target_details
+
+async def compare_repositories(collector, source_repo, target_repo, snapshot=None, max_age=None, recheck_deadline=0):
+    """Fetch the details of one source/target pair.
+
+    With a pre-migration snapshot, only the target is fetched and compared
+    against the frozen source baseline; the source is re-fetched live only
+    when its snapshot is missing or stale.
+
+    Size/language differences on freshly pushed targets are re-checked for
+    up to `recheck_deadline` seconds before the pair is reported.
+    """
+    print(f"Processing post-migration for Source: {source_repo} -> Target: {target_repo}")
+
+    source_details = None
+    if snapshot is not None:
+        source_details = get_snapshot_details(snapshot, source_repo, max_age)
+        if source_details:
+            target_details = await get_repo_details(collector, target_repo)
+        else:
+            print(f"No fresh pre-migration snapshot for {source_repo}; fetching it live.")
+
+    if not source_details:
+        # Get details from both source and target repositories at the same time
+        source_details, target_details = await asyncio.gather(
+            get_repo_details(collector, source_repo),
+            get_repo_details(collector, target_repo),
+        )
+
+    if recheck_deadline > 0 and source_details and target_details and has_pending_statistics(source_details, target_details):
+        target_details = await recheck_target(collector, source_details, target_details, recheck_deadline)
+    return source_details, target_details
+
+def fetch_refs(repo_name):
+    """Read a repository's branch and tag advertisement over the git protocol."""
+    try:
+        return ls_remote(github_url(repo_name), token=GITHUB_TOKEN)
+    except RuntimeError as e:
+        print(f"Error reading refs for repository {repo_name}: {e}")
+        return None
+
+async def verify_refs(collector, source_repo, target_repo):
+    """Compare every branch and tag name -> SHA of a source/target pair.
+
+    Returns the sorted missing, extra and divergent ref names, or None when
+    either side could not be read.
+    """
+    print(f"Verifying refs for Source: {source_repo} -> Target: {target_repo}")
+    source_refs, target_refs = await collector.gather(lambda: fetch_refs(source_repo), lambda: fetch_refs(target_repo))
+    if source_refs is None or target_refs is None:
+        return None
+    missing = sorted(ref for ref in source_refs if ref not in target_refs)
+    extra = sorted(ref for ref in target_refs if ref not in source_refs)
+    divergent = sorted(ref for ref, sha in source_refs.items() if ref in target_refs and target_refs[ref] != sha)
+    return len(source_refs), len(target_refs), missing, extra, divergent
+
+def open_ref_verification_summary():
+    """Open ref_verification_summary.csv for the whole run (see summary_csv.open_summary)."""
+    return open_summary(ref_verification_csv, ['source_repo', 'target_repo', 'source_ref_count', 'target_ref_count',
+                                               'missing_refs', 'extra_refs', 'divergent_refs', 'status'])
+
+def record_ref_verification(file, writer, pair, result):
+    """Log the ref verification of one pair, in input order."""
+    source_repo, target_repo = pair
+    if result is None:
+        print(f"Skipping {source_repo} -> {target_repo} due to unreadable refs.")
+        return
+    source_ref_count, target_ref_count, missing, extra, divergent = result
+    status = "Match" if not (missing or extra or divergent) else "Mismatch"
+    writer.writerow({
+        'source_repo': source_repo,
+        'target_repo': target_repo,
+        'source_ref_count': source_ref_count,
+        'target_ref_count': target_ref_count,
+        'missing_refs': ', '.join(missing),
+        'extra_refs': ', '.join(extra),
+        'divergent_refs': ', '.join(divergent),
+        'status': status
+    })
+    file.flush()
+    print(f"Refs {status.lower()} for {source_repo} -> {target_repo}: {len(missing)} missing, {len(extra)} extra, {len(divergent)} divergent.")
+
+def record_comparison(file, writer, pair, details):
+    """Log the comparison for one pair, in input order."""
+    source_repo, target_repo = pair
+    source_details, target_details = details
+    if source_details and target_details:
+        log_post_migration_summary(writer, source_repo, target_repo, source_details, target_details)
+        file.flush()
+        print(f"Logged post-migration summary for {source_repo} -> {target_repo}.")
+    else:
+        print(f"Skipping {source_repo} -> {target_repo} due to missing details.")
 
 if __name__ == "__main__":
-    # Load repositories from CSV files
-    source_repos = load_repositories_from_csv(source_repos_csv)
-    target_repos = load_repositories_from_csv(target_repos_csv)
+    parser = argparse.ArgumentParser(description='Compare source and target repositories after migration.')
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Maximum number of GitHub API calls in flight')
+    parser.add_argument('--snapshot', nargs='?', const=pre_migration_summary_csv, help=f'Compare targets against a pre-migration summary instead of re-fetching the sources (default: {pre_migration_summary_csv})')
+    parser.add_argument('--max-snapshot-age', type=float, default=DEFAULT_MAX_SNAPSHOT_AGE_HOURS, help='Hours after which a snapshot row is considered stale and the source is fetched live')
+    parser.add_argument('--verify-refs', action='store_true', help=f'Compare every branch and tag SHA over the git protocol instead of the API statistics, writing {ref_verification_csv}')
+    parser.add_argument('--recheck-deadline', type=float, default=DEFAULT_RECHECK_DEADLINE_MINUTES, help='Minutes to keep re-checking size/language of freshly pushed targets before reporting them (0 disables)')
+    add_discovery_arguments(parser)
+    parser.add_argument('--target-org', help='With --org, compare each source repository with the repository of the same name in this organization')
+    args = parser.parse_args()
+    if args.org and not args.target_org:
+        parser.error('--target-org is required with --org')
+
+    try:
+        snapshot = load_pre_migration_snapshot(args.snapshot) if args.snapshot else None
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    max_age = datetime.timedelta(hours=args.max_snapshot_age)
+
+    if args.org:
+        # Stream the source organization's repositories, pairing each with its namesake in the target organization
+        pairs = ((record['full_name'], f"{args.target_org}/{record['name']}") for record in discover_repositories(args, token=GITHUB_TOKEN))
+        source_repos = target_repos = None
+    else:
+        # Load repositories from CSV files
+        source_repos = load_repositories_from_csv(source_repos_csv)
+        target_repos = load_repositories_from_csv(target_repos_csv)
+        pairs = zip(source_repos, target_repos)
 
-    if len(source_repos) != len(target_repos):
+    if source_repos is not None and len(source_repos) != len(target_repos):
         print("Mismatch in the number of source and target repositories.")
+    elif args.verify_refs:
+        # Ref advertisements cost no API quota, so the whole batch is verified concurrently
+        collector = Collector(concurrency=args.concurrency)
+        refs_file, refs_writer = open_ref_verification_summary()
+        with refs_file:
+            collector.run(
+                pairs,
+                lambda pair: verify_refs(collector, *pair),
+                lambda pair, result: record_ref_verification(refs_file, refs_writer, pair, result),
+            )
     else:
-        # Process each pair of source and target repos
-        for source_repo, target_repo in zip(source_repos, target_repos):
-            print(f"Processing post-migration for Source: {source_repo} -> Target: {target_repo}")
-
-            # Get details from both source and target repositories
-            source_details = get_repo_details(source_repo)
-            target_details = get_repo_details(target_repo)
-
-            if source_details and target_details:
-                log_post_migration_summary(source_repo, target_repo, source_details, target_details)
-                print(f"Logged post-migration summary for {source_repo} -> {target_repo}.")
-            else:
-                print(f"Skipping {source_repo} -> {target_repo} due to missing details.")
+        # Process the source and target pairs concurrently, logging them in input order.
+        # The wide window lets the batch keep going while pending targets are re-checked.
+        collector = Collector(concurrency=args.concurrency, window=max(args.concurrency * 8, 1000))
+        summary_file, summary_writer = open_post_migration_summary()
+        with summary_file:
+            collector.run(
+                pairs,
+                lambda pair: compare_repositories(collector, *pair, snapshot=snapshot, max_age=max_age,
+                                                  recheck_deadline=args.recheck_deadline * 60),
+                lambda pair, details: record_comparison(summary_file, summary_writer, pair, details),
+            )
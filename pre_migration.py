@@ -1,6 +1,13 @@
 import os
 import csv
+import argparse
+import datetime
 from github import Github
+from async_collector import Collector, DEFAULT_CONCURRENCY
+from github_memo import GithubMemo
+from repo_discovery import add_discovery_arguments, discover_repositories
+from summary_csv import open_summary
+from build_detector import BuildSystemMatcher, BuildDetectionCache, detect_build_systems, select_build_systems, format_build_systems, format_build_files
 
 # GitHub connection
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
@@ -8,18 +15,20 @@ if not GITHUB_TOKEN:
     raise ValueError("GITHUB_TOKEN environment variable not set.")
 g = Github(GITHUB_TOKEN)
 
+# Run-scoped memo so each repository, contents and branch lookup is fetched once
+memo = GithubMemo(g)
+
 # Input and output files
 source_repos_file = "source_repos.csv"
 pre_migration_csv = "pre_migration_summary.csv"
 
-# Build system file indicators
-build_systems = {
-    'maven': 'pom.xml',
-    'gradle': 'build.gradle',
-    'npm': 'package.json',
-    'python': 'requirements.txt',
-    # Add others as necessary...
-}
+# Build systems reported in the pre-migration summary, out of the shared
+# indicator table of build_detector.py
+reported_build_systems = ('maven', 'gradle', 'npm', 'python_pip')
+build_matcher = BuildSystemMatcher()
+
+# Build-detection results shared across scripts and runs, keyed by tree SHA
+build_cache = BuildDetectionCache()
 
 def load_repositories_from_file(file_path):
     """Read repository names from a CSV file."""
@@ -29,58 +38,80 @@ def load_repositories_from_file(file_path):
         repos = [row[0].strip() for row in reader if row]
     return repos
 
-def detect_pre_migration_details(repo_name):
-    """Fetch pre-migration details from the source repository."""
-    try:
-        repo = g.get_repo(repo_name)
-        primary_language = repo.language
-        contents = repo.get_contents("")
-        repo_files = [content.path for content in contents]
-
-        detected_build_systems = []
-        for build_system, indicator_file in build_systems.items():
-            if any(indicator_file in file for file in repo_files):
-                detected_build_systems.append(build_system)
+async def detect_pre_migration_details(collector, repo_name):
+    """Fetch pre-migration details from the source repository.
 
-        build_systems_detected = ', '.join(detected_build_systems) if detected_build_systems else "No common build system detected."
-        branches = [branch.name for branch in repo.get_branches()]
+    Metadata, branches and the recursive file tree are independent reads, so
+    they are issued concurrently through the collector.
+    """
+    try:
+        repo, branches, found = await collector.gather(
+            lambda: memo.get_repo(repo_name),
+            lambda: memo.get_branches(repo_name),
+            lambda: detect_build_systems(memo, repo_name, build_matcher, cache=build_cache),
+        )
+        found = select_build_systems(found, reported_build_systems)
+        build_systems_detected = format_build_systems(found)
+        build_files = format_build_files(found)
+        branches = [branch.name for branch in branches]
         branch_count = len(branches)
+        primary_language = repo.language
         repo_size = repo.size  # Repository size in KB
 
-        return primary_language, build_systems_detected, branch_count, repo_size, branches
+        return primary_language, build_systems_detected, branch_count, repo_size, branches, build_files
     except Exception as e:
         print(f"Error fetching repository data for {repo_name}: {e}")
-        return None, None, None, None, None
+        return None, None, None, None, None, None
 
-def log_pre_migration_details(repo_name, primary_language, build_system, branch_count, repo_size, branches):
-    """Log pre-migration details to a CSV file."""
-    with open(pre_migration_csv, mode='a', newline='') as file:
-        fieldnames = ['repo_name', 'primary_language', 'build_system', 'branch_count', 'repo_size', 'branches']
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
+# Columns of pre_migration_summary.csv
+pre_migration_fieldnames = ['repo_name', 'primary_language', 'build_system', 'branch_count', 'repo_size', 'branches', 'build_files',
+                            'collected_at']
 
-        if file.tell() == 0:
-            writer.writeheader()
+def open_pre_migration_summary():
+    """Open pre_migration_summary.csv once for the whole run (see summary_csv.open_summary)."""
+    return open_summary(pre_migration_csv, pre_migration_fieldnames)
 
-        writer.writerow({
+def log_pre_migration_details(writer, repo_name, primary_language, build_system, branch_count, repo_size, branches, build_files):
+    """Log pre-migration details to pre_migration_summary.csv through an open writer."""
+    writer.writerow({
             'repo_name': repo_name,
             'primary_language': primary_language,
             'build_system': build_system,
             'branch_count': branch_count,
             'repo_size': repo_size,
-            'branches': ', '.join(branches)
+            'branches': ', '.join(branches),
+            'build_files': build_files,
+            'collected_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
         })
 
+def record_pre_migration_details(file, writer, repo_name, details):
+    """Log the collected details for one repository, in input order."""
+    primary_language, build_system, branch_count, repo_size, branches, build_files = details
+    if primary_language and build_system:
+        log_pre_migration_details(writer, repo_name, primary_language, build_system, branch_count, repo_size, branches, build_files)
+        file.flush()
+        print(f"Pre-migration data logged for {repo_name}.")
+    else:
+        print(f"Skipping {repo_name} due to missing pre-migration data.")
+
 if __name__ == "__main__":
-    repos = load_repositories_from_file(source_repos_file)
+    parser = argparse.ArgumentParser(description='Gather pre-migration details for the source repositories.')
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Maximum number of GitHub API calls in flight')
+    add_discovery_arguments(parser)
+    args = parser.parse_args()
+
+    if args.org:
+        # Stream the organization's repositories straight into the collector
+        repos = (record['full_name'] for record in discover_repositories(args, token=GITHUB_TOKEN))
+    else:
+        repos = load_repositories_from_file(source_repos_file)
+    collector = Collector(concurrency=args.concurrency)
 
-    for repo_name in repos:
+    async def gather_details(repo_name):
         print(f"Gathering pre-migration data for {repo_name}...")
+        return await detect_pre_migration_details(collector, repo_name)
 
-        # Gather pre-migration details
-        primary_language, build_system, branch_count, repo_size, branches = detect_pre_migration_details(repo_name)
-        if primary_language and build_system:
-            # Log pre-migration details
-            log_pre_migration_details(repo_name, primary_language, build_system, branch_count, repo_size, branches)
-            print(f"Pre-migration data logged for {repo_name}.")
-        else:
-            print(f"Skipping {repo_name} due to missing pre-migration data.")
+    summary_file, summary_writer = open_pre_migration_summary()
+    with summary_file:
+        collector.run(repos, gather_details,
+                      lambda repo_name, details: record_pre_migration_details(summary_file, summary_writer, repo_name, details))
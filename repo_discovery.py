@@ -0,0 +1,149 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# GitHub API base URL
+GITHUB_BASE_API_URL = "https://api.github.com"
+PER_PAGE = 100
+
+# Number of repository pages fetched concurrently once the last page is known
+DEFAULT_PAGE_CONCURRENCY = 8
+
+def slim_record(repo):
+    """Keep only the fields the migration and scanner scripts need from a repository listing."""
+    return {
+        'full_name': repo['full_name'],
+        'name': repo['name'],
+        'size': repo['size'],
+        'pushed_at': repo['pushed_at'],
+        'archived': repo['archived'],
+        'fork': repo['fork'],
+        'default_branch': repo.get('default_branch'),
+    }
+
+def make_repo_filter(exclude_archived=False, exclude_forks=False, min_size=None, max_size=None,
+                     pushed_after=None, name_pattern=None):
+    """Build a client-side predicate over slim repository records."""
+    name_regex = re.compile(name_pattern) if name_pattern else None
+
+    def keep(record):
+        if exclude_archived and record['archived']:
+            return False
+        if exclude_forks and record['fork']:
+            return False
+        if min_size is not None and record['size'] < min_size:
+            return False
+        if max_size is not None and record['size'] > max_size:
+            return False
+        # pushed_at is an ISO-8601 UTC timestamp, so string comparison orders it correctly
+        if pushed_after and (record['pushed_at'] or '') < pushed_after:
+            return False
+        if name_regex and not name_regex.search(record['name']):
+            return False
+        return True
+
+    return keep
+
+def fetch_page(session, org, page, repo_type):
+    """Fetch one page of an organization's repositories."""
+    url = f"{GITHUB_BASE_API_URL}/orgs/{org}/repos"
+    params = {'type': repo_type, 'per_page': PER_PAGE, 'page': page}
+    response = session.get(url, params=params)
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to fetch repositories of '{org}' (page {page}): {response.status_code} {response.text}")
+    return response
+
+def iter_org_repos(org, token=None, repo_type='all', repo_filter=None, concurrency=DEFAULT_PAGE_CONCURRENCY):
+    """Stream slim records of every repository in an organization.
+
+    The first page is fetched alone; its `Link` header reveals the last page,
+    after which the remaining pages are fetched concurrently. Records are
+    yielded in page order as soon as their page arrives, and at most
+    `concurrency * 2` pages are held in memory, so memory stays flat however
+    large the organization is.
+
+    `repo_type` is the server-side filter of the API (all, public, private,
+    forks, sources, member); `repo_filter` is an optional client-side
+    predicate, e.g. from make_repo_filter.
+    """
+    session = requests.Session()
+    session.headers['Accept'] = 'application/vnd.github.v3+json'
+    if token:
+        session.headers['Authorization'] = f'token {token}'
+
+    def records(response):
+        for repo in response.json():
+            record = slim_record(repo)
+            if repo_filter is None or repo_filter(record):
+                yield record
+
+    first = fetch_page(session, org, 1, repo_type)
+    yield from records(first)
+    last_page = int(re.search(r'[?&]page=(\d+)', first.links['last']['url']).group(1)) if 'last' in first.links else 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        pages = iter(range(2, last_page + 1))
+        for page in pages:
+            pending.append(executor.submit(fetch_page, session, org, page, repo_type))
+            if len(pending) >= concurrency * 2:
+                break
+        while pending:
+            response = pending.popleft().result()
+            next_page = next(pages, None)
+            if next_page is not None:
+                pending.append(executor.submit(fetch_page, session, org, next_page, repo_type))
+            yield from records(response)
+
+def add_discovery_arguments(parser, *org_flags, required=False, org_help='List the repositories of this organization instead of reading the input CSV'):
+    """Add the organization and filter options shared by the scripts that can discover their repositories."""
+    group = parser.add_argument_group('repository discovery')
+    group.add_argument(*(org_flags or ('--org',)), dest='org', required=required, help=org_help)
+    group.add_argument('--repo-type', default='all', choices=['all', 'public', 'private', 'forks', 'sources', 'member'], help='Server-side repository type filter')
+    group.add_argument('--exclude-archived', action='store_true', help='Skip archived repositories')
+    group.add_argument('--exclude-forks', action='store_true', help='Skip forked repositories')
+    group.add_argument('--min-size', type=int, help='Skip repositories smaller than this size in KB')
+    group.add_argument('--max-size', type=int, help='Skip repositories larger than this size in KB')
+    group.add_argument('--pushed-after', help='Skip repositories not pushed since this date (YYYY-MM-DD)')
+    group.add_argument('--name-pattern', help='Only keep repositories whose name matches this regular expression')
+    return group
+
+def discover_repositories(args, token=None):
+    """Stream slim records for the organization and filters given on the command line."""
+    pushed_after = args.pushed_after
+    if pushed_after:
+        pushed_after = datetime.date.fromisoformat(pushed_after).isoformat()
+    repo_filter = make_repo_filter(args.exclude_archived, args.exclude_forks, args.min_size, args.max_size,
+                                   pushed_after, args.name_pattern)
+    return iter_org_repos(args.org, token=token, repo_type=args.repo_type, repo_filter=repo_filter)
+
+def main():
+    parser = argparse.ArgumentParser(description='List the repositories of a GitHub organization, e.g. to build source_repos.csv.')
+    add_discovery_arguments(parser, '-o', '--organization', required=True, org_help='GitHub organization name')
+    parser.add_argument('-t', '--token', default=os.getenv('GITHUB_TOKEN'), help='GitHub access token (defaults to GITHUB_TOKEN)')
+    parser.add_argument('-f', '--format', default='csv', choices=['csv', 'jsonl'], help='csv writes org/repo lines, jsonl writes the slim records')
+    parser.add_argument('--output', help='Output file (defaults to standard output)')
+    args = parser.parse_args()
+
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        writer = csv.writer(output)
+        for record in discover_repositories(args, token=args.token):
+            if args.format == 'jsonl':
+                output.write(json.dumps(record) + '\n')
+            else:
+                writer.writerow([record['full_name']])
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == '__main__':
+    main()
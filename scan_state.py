@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+
+# Directory holding the per-repository scan state
+DEFAULT_STATE_DIR = "scanner_state"
+
+class ScanStateStore:
+    """Per-repository record of what the scanner found, for incremental rescans.
+
+    For every repository the store keeps the `pushed_at` timestamp and head
+    SHA seen at the last scan, together with the matches found for each value
+    (an empty list for values without matches). Each repository has its own
+    small JSON file, written atomically and loaded only while that repository
+    is processed, so memory stays flat however large the organization is.
+
+    `scope` describes how matches were produced (backend, case sensitivity,
+    size limit); state written under another scope is ignored.
+    """
+
+    def __init__(self, state_dir=DEFAULT_STATE_DIR, scope='api'):
+        self.state_dir = state_dir
+        self.scope = scope
+
+    def _path(self, full_repo_name):
+        return os.path.join(self.state_dir, *full_repo_name.split('/')) + '.json'
+
+    def load(self, full_repo_name):
+        """Return the stored state of a repository, or None."""
+        try:
+            with open(self._path(full_repo_name), 'r') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return state if state.get('scope') == self.scope else None
+
+    def save(self, full_repo_name, pushed_at, head, matches_by_value):
+        """Store the scan result of a repository."""
+        path = self._path(full_repo_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        state = {'scope': self.scope, 'pushed_at': pushed_at, 'head': head, 'values': matches_by_value}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(state, file)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: could not save scan state of {full_repo_name}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def plan(self, record, values, full_rescan=False):
+        """Decide what must be scanned for a discovered repository.
+
+        Returns (state, kept, values to scan): `kept` holds the stored matches
+        by value that are still valid, which is all of them when the repository
+        was not pushed since its last scan and none otherwise; every value
+        missing from `kept` must be scanned.
+        """
+        state = None if full_rescan else self.load(record['full_name'])
+        kept = state['values'] if state is not None and state.get('pushed_at') == record['pushed_at'] else {}
+        return state, kept, [value for value in values if value not in kept]
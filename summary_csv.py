@@ -0,0 +1,51 @@
+import csv
+import datetime
+import os
+import tempfile
+
+def read_header(path):
+    """Return the header row of a CSV file, or None if the file is missing or empty."""
+    try:
+        with open(path, 'r', newline='') as file:
+            return next(csv.reader(file), None)
+    except OSError:
+        return None
+
+def _upgrade(path, fieldnames):
+    """Rewrite a summary logged under fewer columns with the current header, leaving the new columns empty."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with open(path, 'r', newline='') as source, os.fdopen(fd, 'w', newline='') as target:
+            writer = csv.DictWriter(target, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(csv.DictReader(source))
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def open_summary(path, fieldnames):
+    """Open a summary CSV for appending rows with `fieldnames`; return (file, DictWriter).
+
+    Rows are only ever appended under a matching header. A file logged by an
+    older version with a subset of the columns is rewritten with the current
+    header first (its rows keep their values, new columns stay empty); a file
+    with any other header is moved aside to "<name>.<timestamp>.csv" and a
+    new one is started.
+    """
+    header = read_header(path)
+    if header is not None and header != list(fieldnames):
+        if set(header) <= set(fieldnames):
+            print(f"Upgrading {path} to the current columns.")
+            _upgrade(path, fieldnames)
+        else:
+            root, extension = os.path.splitext(path)
+            rotated = f"{root}.{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}{extension}"
+            print(f"{path} has different columns; moving it to {rotated} and starting a new one.")
+            os.replace(path, rotated)
+    file = open(path, mode='a', newline='')
+    writer = csv.DictWriter(file, fieldnames=fieldnames)
+    if file.tell() == 0:  # Write header only if file is empty
+        writer.writeheader()
+    return file, writer
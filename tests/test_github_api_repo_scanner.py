@@ -0,0 +1,77 @@
+import github_api_repo_scanner as scanner
+from match_output import MatchWriter
+from scan_state import ScanStateStore
+
+def hit(repo, value):
+    return {'repo': repo, 'file': 'main.tf', 'value': value, 'html_url': f'https://github.com/{repo}/blob/main/main.tf'}
+
+def test_group_by_value_ignores_values_not_requested():
+    grouped = scanner.group_by_value([hit('org/a', 'x'), hit('org/a', 'y')], ['y'])
+    assert grouped == {'y': [hit('org/a', 'y')]}
+
+def test_scan_organization_with_unchanged_and_changed_repositories(tmp_path, monkeypatch):
+    store = ScanStateStore(str(tmp_path))
+    # org/a is unchanged and already has a stored answer for 'x'; org/b was pushed since
+    store.save('org/a', '2024-01-01T00:00:00Z', None, {'x': [hit('org/a', 'x')]})
+    store.save('org/b', '2024-01-01T00:00:00Z', None, {'x': []})
+    records = [{'full_name': 'org/a', 'pushed_at': '2024-01-01T00:00:00Z'},
+               {'full_name': 'org/b', 'pushed_at': '2024-02-01T00:00:00Z'}]
+
+    # The org-wide search for 'x' also returns the hit in org/a, which org/a did not need
+    def search_organization(org_name, values, headers, allowed_repos=None, failed_values=None):
+        assert values == ['x']
+        yield hit('org/a', 'x')
+        yield hit('org/b', 'x')
+    monkeypatch.setattr(scanner, 'search_organization', search_organization)
+
+    results = list(scanner.scan_organization('org', records, ['x'], {}, store))
+
+    assert results == [('org/a', [hit('org/a', 'x')]), ('org/b', [hit('org/b', 'x')])]
+    assert store.load('org/b')['values'] == {'x': [hit('org/b', 'x')]}
+
+def test_scan_organization_after_a_failed_batch(tmp_path, monkeypatch):
+    store = ScanStateStore(str(tmp_path))
+    records = [{'full_name': 'org/a', 'pushed_at': '2024-01-01T00:00:00Z'}]
+
+    # A partial hit for 'x' arrives before its batch fails
+    def search_organization(org_name, values, headers, allowed_repos=None, failed_values=None):
+        yield hit('org/a', 'x')
+        failed_values.add('x')
+        yield hit('org/a', 'y')
+    monkeypatch.setattr(scanner, 'search_organization', search_organization)
+
+    results = list(scanner.scan_organization('org', records, ['x', 'y'], {}, store))
+
+    # The partial hit was already yielded when the batch failed
+    assert results == [('org/a', [hit('org/a', 'x')]), ('org/a', [hit('org/a', 'y')])]
+    # 'x' is not stored, so the next run searches it again
+    assert store.load('org/a')['values'] == {'y': [hit('org/a', 'y')]}
+
+def test_scan_organization_yields_each_hit_before_the_search_ends(tmp_path, monkeypatch):
+    store = ScanStateStore(str(tmp_path))
+    records = [{'full_name': 'org/a', 'pushed_at': '2024-01-01T00:00:00Z'},
+               {'full_name': 'org/b', 'pushed_at': '2024-01-01T00:00:00Z'}]
+    searched = []
+
+    def search_organization(org_name, values, headers, allowed_repos=None, failed_values=None):
+        for repo in ('org/a', 'org/b'):
+            searched.append(repo)
+            yield hit(repo, 'x')
+    monkeypatch.setattr(scanner, 'search_organization', search_organization)
+
+    results = scanner.scan_organization('org', records, ['x'], {}, store)
+
+    assert next(results) == ('org/a', [hit('org/a', 'x')])
+    assert searched == ['org/a']
+    # Nothing is stored until every batch has been searched
+    assert store.load('org/a') is None
+    assert list(results) == [('org/b', [hit('org/b', 'x')])]
+    assert store.load('org/a')['values'] == {'x': [hit('org/a', 'x')]}
+
+def test_match_writer_flushes_at_the_end_of_each_repository(tmp_path):
+    path = tmp_path / 'matches.jsonl'
+    with MatchWriter(str(path)) as writer:
+        writer.write(hit('org/a', 'x'))
+        writer.end_repository()
+        # The last repository's match is on disk before the writer is closed
+        assert path.read_text().count('\n') == 1
@@ -0,0 +1,72 @@
+from hcl_parser import parse_hcl
+
+SOURCE = b'''resource "aws_instance" "web" {
+  ami = "ami-123" # trailing comment
+  tags = {
+    Name = "web # not a comment }"
+    Env  = "${var.env}-}"
+  }
+  security_groups = [
+    "sg-1",
+    "sg-2",
+  ]
+  user_data = <<-EOT
+    #!/bin/bash
+    echo "}"
+  EOT
+  lifecycle {
+    prevent_destroy = true
+  }
+  dynamic "ingress" {
+    for_each = var.ports
+    content {
+      from_port = ingress.value
+    }
+  }
+}
+variable "region" { default = "us-east-1" }
+locals { greeting = "hi ${upper("}")}" }
+'''
+
+def values(rows):
+    return [(row.type, row.name, row.attribute, row.value) for row in rows]
+
+def assert_spans(data, rows):
+    for row in rows:
+        assert data[row.start:row.end] == row.value.encode('utf-8'), row
+
+def test_parse_hcl_rows():
+    rows = parse_hcl(SOURCE)
+
+    web = ('resource', 'aws_instance/web')
+    assert values(rows) == [
+        (*web, 'ami', '"ami-123"'),
+        # Multi-line map, with '#' and '}' inside strings and templates
+        (*web, 'tags', '{\n    Name = "web # not a comment }"\n    Env  = "${var.env}-}"\n  }'),
+        # Multi-line list
+        (*web, 'security_groups', '[\n    "sg-1",\n    "sg-2",\n  ]'),
+        # Heredoc, whose body holds a '#' and a '}'
+        (*web, 'user_data', '<<-EOT\n    #!/bin/bash\n    echo "}"\n  EOT'),
+        # Nested blocks
+        (*web, 'lifecycle.prevent_destroy', 'true'),
+        (*web, 'dynamic.ingress.for_each', 'var.ports'),
+        (*web, 'dynamic.ingress.content.from_port', 'ingress.value'),
+        # One-line blocks
+        ('variable', 'region', 'default', '"us-east-1"'),
+        ('locals', '', 'greeting', '"hi ${upper("}")}"'),
+    ]
+    assert_spans(SOURCE, rows)
+
+def test_parse_hcl_spans_are_byte_offsets():
+    data = 'variable "name" {\r\n  default = "café"\r\n}\r\nregion = "eu-west-1"\r\n'.encode('utf-8')
+    rows = parse_hcl(data)
+
+    assert values(rows) == [('variable', 'name', 'default', '"café"'), (None, None, 'region', '"eu-west-1"')]
+    assert_spans(data, rows)
+
+def test_parse_hcl_reports_blocks_without_attributes():
+    blocks = []
+    rows = parse_hcl(b'variable "empty" {}\nvariable "region" { default = "us-east-1" }\n', blocks)
+
+    assert values(rows) == [('variable', 'region', 'default', '"us-east-1"')]
+    assert [block[:2] for block in blocks] == [('variable', 'empty'), ('variable', 'region')]
@@ -0,0 +1,84 @@
+from hcl_parser import parse_hcl
+from tf_analysis import file_hash
+from tf_file_update import apply_file_edits
+
+SOURCE = b'''resource "aws_security_group" "web" {
+  name = "web"
+  ingress {
+    from_port = 80
+  }
+  ingress {
+    from_port = 443
+  }
+}
+'''
+
+def write_source(tmp_path, data=SOURCE):
+    path = tmp_path / 'main.tf'
+    path.write_bytes(data)
+    return path
+
+def edit_for(data, attribute, new_value, index=0, **overrides):
+    """An edit as read_updates_from_csv builds it, from the `index`-th row of `attribute`."""
+    row = [row for row in parse_hcl(data) if row.attribute == attribute][index]
+    edit = {'Type': row.type, 'Name': row.name, 'Attribute': row.attribute, 'Old Value': row.value,
+            'New Value': new_value, 'Span': (row.start, row.end), 'File Hash': file_hash(data)}
+    edit.update(overrides)
+    return edit
+
+def test_splices_by_span_when_the_hash_matches(tmp_path):
+    path = write_source(tmp_path)
+    edit = edit_for(SOURCE, 'name', 'api')
+
+    apply_file_edits(str(path), [edit])
+
+    assert edit['Status'] == 'applied'
+    assert path.read_bytes() == SOURCE.replace(b'"web"\n', b'"api"\n')
+
+def test_reparses_when_the_file_changed(tmp_path):
+    edit = edit_for(SOURCE, 'name', 'api')
+    # Lines added since the analysis shift every recorded span
+    changed = b'# Managed by the platform team\n\n' + SOURCE
+    path = write_source(tmp_path, changed)
+
+    apply_file_edits(str(path), [edit])
+
+    assert edit['Status'] == 'applied'
+    assert path.read_bytes() == changed.replace(b'"web"\n', b'"api"\n')
+
+def test_duplicate_keys_edit_the_analysed_occurrence(tmp_path):
+    path = write_source(tmp_path)
+    # Both ingress blocks give the key (resource, aws_security_group/web, ingress.from_port)
+    edit = edit_for(SOURCE, 'ingress.from_port', 8443, index=1)
+    stale = edit_for(SOURCE, 'ingress.from_port', 8443, index=1, Span=None)
+
+    apply_file_edits(str(path), [edit])
+
+    assert edit['Status'] == 'applied'
+    assert path.read_bytes() == SOURCE.replace(b'443', b'8443')
+    # Without a span, the re-parse picks the occurrence still holding the old value
+    path.write_bytes(SOURCE)
+    apply_file_edits(str(path), [stale])
+    assert path.read_bytes() == SOURCE.replace(b'443', b'8443')
+
+def test_later_edit_of_the_same_value_supersedes_the_earlier_one(tmp_path):
+    path = write_source(tmp_path)
+    first = edit_for(SOURCE, 'name', 'api')
+    second = edit_for(SOURCE, 'name', 'frontend')
+
+    apply_file_edits(str(path), [first, second])
+
+    assert (first['Status'], second['Status']) == ('superseded', 'applied')
+    assert path.read_bytes() == SOURCE.replace(b'"web"\n', b'"frontend"\n')
+
+def test_unmatched_edit_leaves_the_file_untouched(tmp_path):
+    path = write_source(tmp_path)
+    mtime = path.stat().st_mtime_ns
+    edit = {'Type': 'resource', 'Name': 'aws_security_group/web', 'Attribute': 'description', 'Old Value': '"web"',
+            'New Value': 'api', 'Span': None, 'File Hash': file_hash(SOURCE)}
+
+    apply_file_edits(str(path), [edit])
+
+    assert edit['Status'] == 'unmatched'
+    assert path.read_bytes() == SOURCE
+    assert path.stat().st_mtime_ns == mtime
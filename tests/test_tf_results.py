@@ -0,0 +1,22 @@
+from tf_results import ResultStore
+
+CSV = ('Repository,GitHub URL,File Path,Type,Name,Attribute,Value,New Value,Value Start,Value End,File Hash\r\n'
+       'org/a,https://github.com/org/a,prod/main.tf,provider,aws,region,"""us-east-1""",eu-west-1,10,21,abc\r\n'
+       'org/a,https://github.com/org/a,dev/main.tf,provider,aws,region,"""us-east-1""",,,,\r\n')
+
+def test_write_csv_keeps_extra_columns_and_missing_spans(tmp_path):
+    source = tmp_path / 'results.csv'
+    source.write_bytes(CSV.encode('utf-8'))
+    store = ResultStore.from_csv(str(source))
+
+    kept = store.where({'File Path': lambda value: 'prod' in value})
+    output = tmp_path / 'prod.csv'
+    store.write_csv(str(output), kept)
+
+    assert output.read_bytes().decode('utf-8').splitlines() == [
+        'Repository,GitHub URL,File Path,Type,Name,Attribute,Value,Value Start,Value End,File Hash,New Value',
+        'org/a,https://github.com/org/a,prod/main.tf,provider,aws,region,"""us-east-1""",10,21,abc,eu-west-1',
+    ]
+    # A row without a span is written back with empty cells, not -1
+    store.write_csv(str(output), [1])
+    assert output.read_bytes().decode('utf-8').splitlines()[1] == 'org/a,https://github.com/org/a,dev/main.tf,provider,aws,region,"""us-east-1""",,,,'
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from git_utils import current_branch, sparse_checkout
+from hcl_parser import PARSER_VERSION, HclValue, parse_hcl
+
+# Directories never holding Terraform sources worth analysing: VCS data,
+# provider/module caches (often hundreds of MB of binaries) and tool caches
+IGNORED_DIRS = frozenset({'.git', '.terraform', '.terragrunt-cache', 'node_modules', '.idea', '.vscode', '__pycache__'})
+
+# Number of files sent to a worker process in one task
+FILES_PER_TASK = 32
+
+# Directory holding parsed rows keyed by file content hash
+DEFAULT_PARSE_CACHE_DIR = ".tf_parse_cache"
+
+# Sparse checkouts of the repositories analysed in multi-repository mode
+DEFAULT_CHECKOUT_DIR = "terraform_checkouts"
+
+# Number of repositories checked out ahead of the one being parsed
+CLONE_CONCURRENCY = 4
+
+def find_files(directory, extensions):
+    """Yield the files under `directory` ending with one of `extensions`, in a deterministic order.
+
+    Ignored directories are pruned from the walk instead of being descended
+    into and filtered afterwards.
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS)
+        for name in sorted(files):
+            if name.endswith(extensions):
+                yield os.path.join(root, name)
+
+def file_hash(data):
+    """Return the content hash identifying a version of a file (SHA-256, hex)."""
+    return hashlib.sha256(data).hexdigest()
+
+def row_key(row):
+    """Return the (Type, Name, Attribute) the analysis CSVs report for a parsed HclValue.
+
+    Top-level attributes, i.e. the variables set in .tfvars files, are
+    reported as ('tfvars', variable name, 'value').
+    """
+    if row.type is None:
+        return ('tfvars', row.attribute, 'value')
+    return (row.type, row.name, row.attribute)
+
+def _read_cached_rows(rows_dir, content_hash):
+    try:
+        with open(os.path.join(rows_dir, f"{content_hash}.json"), 'r') as file:
+            return [HclValue(*row) for row in json.load(file)]
+    except (OSError, ValueError, TypeError):
+        return None
+
+def _write_cached_rows(rows_dir, content_hash, rows):
+    fd, tmp_path = tempfile.mkstemp(dir=rows_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump(rows, file)
+        os.replace(tmp_path, os.path.join(rows_dir, f"{content_hash}.json"))
+    except OSError as e:
+        print(f"Warning: could not write parse cache entry {content_hash}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+class ParseCache:
+    """On-disk cache of parsed Terraform rows keyed by file content hash.
+
+    Rows are stored once per distinct content (a SHA-256 of the file) under a
+    directory named after the parser version, so a parser change never serves
+    stale rows. An index of path -> (mtime, size, content hash) lets unchanged
+    files skip even the read and hash: only files whose mtime or size moved
+    are read again, and only those whose content actually changed are parsed.
+
+    The path index is written back by `save`, once per run: use the cache as
+    a context manager to save it on exit.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_PARSE_CACHE_DIR):
+        self.rows_dir = os.path.join(cache_dir, f"v{PARSER_VERSION}")
+        os.makedirs(self.rows_dir, exist_ok=True)
+        self._index_path = os.path.join(self.rows_dir, 'index.json')
+        try:
+            with open(self._index_path, 'r') as file:
+                self.index = json.load(file)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def known_hash(self, file_path, stat):
+        """Return the content hash recorded for a file whose mtime and size did not change, or None."""
+        entry = self.index.get(os.path.abspath(file_path))
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.save()
+
+    def record(self, file_path, stat, content_hash):
+        self.index[os.path.abspath(file_path)] = [stat.st_mtime_ns, stat.st_size, content_hash]
+
+    def save(self):
+        """Write the path index back to disk."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.rows_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(self.index, file)
+            os.replace(tmp_path, self._index_path)
+        except OSError as e:
+            print(f"Warning: could not save the parse cache index: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+def _parse_task(rows_dir, entries):
+    """Worker task: return [(rows, content hash)] for [(file path, known content hash)]."""
+    results = []
+    for file_path, known_hash in entries:
+        if known_hash is not None:
+            rows = _read_cached_rows(rows_dir, known_hash)
+            if rows is not None:
+                results.append((rows, known_hash))
+                continue
+        with open(file_path, 'rb') as file:
+            data = file.read()
+        content_hash = file_hash(data)
+        rows = _read_cached_rows(rows_dir, content_hash) if rows_dir is not None else None
+        if rows is None:
+            rows = parse_hcl(data)
+            if rows_dir is not None:
+                _write_cached_rows(rows_dir, content_hash, rows)
+        results.append((rows, content_hash))
+    return results
+
+def parse_files(file_paths, jobs=None, cache=None, executor=None):
+    """Yield (file path, HclValue rows, content hash) for each file, in order, parsing across a process pool.
+
+    Only a bounded number of tasks is in flight at any time, so memory stays
+    flat however many files there are and results can be written out as they
+    arrive. With a ParseCache, unchanged files are answered from the cache
+    and recorded in its index, which the caller saves (once, not per call).
+    An existing `executor` (a process pool) can be passed to share it across
+    calls.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            yield from parse_files(file_paths, jobs, cache, executor)
+        return
+    rows_dir = cache.rows_dir if cache is not None else None
+
+    def tasks():
+        task = []
+        for file_path in file_paths:
+            if cache is not None:
+                stat = os.stat(file_path)
+                task.append((file_path, stat, cache.known_hash(file_path, stat)))
+            else:
+                task.append((file_path, None, None))
+            if len(task) >= FILES_PER_TASK:
+                yield task
+                task = []
+        if task:
+            yield task
+
+    def results(task, future):
+        for (file_path, stat, _), (rows, content_hash) in zip(task, future.result()):
+            if cache is not None:
+                cache.record(file_path, stat, content_hash)
+            yield file_path, rows, content_hash
+
+    pending = deque()
+    for task in tasks():
+        entries = [(file_path, known_hash) for file_path, _, known_hash in task]
+        pending.append((task, executor.submit(_parse_task, rows_dir, entries)))
+        if len(pending) >= jobs * 2:
+            yield from results(*pending.popleft())
+    while pending:
+        yield from results(*pending.popleft())
+
+def read_repo_list(path):
+    """Read org/repo names from a file, one per line (the format of source_repos.csv)."""
+    with open(path, 'r') as file:
+        return [line.strip() for line in file if line.strip()]
+
+def checkout_repository(repo_name, extensions, workdir=DEFAULT_CHECKOUT_DIR, token=None):
+    """Check out only the files with the given extensions of a repository; return (path, default branch)."""
+    path = os.path.join(workdir, *repo_name.split('/'))
+    sparse_checkout(repo_name, path, [f'*{extension}' for extension in extensions], token=token)
+    return path, current_branch(path)
+
+def analyze_repositories(repo_names, extensions, workdir=DEFAULT_CHECKOUT_DIR, token=None, jobs=None, cache=None):
+    """Parse the Terraform files of many repositories, fetching nothing else.
+
+    Each repository gets a shallow, blobless, sparse checkout holding only
+    the files with the given extensions, so application code is never
+    downloaded. Checkouts of the next repositories run in background threads
+    while the current one is parsed across a shared process pool.
+
+    Yields (repo name, default branch, checkout path, file path, rows,
+    content hash) repository by repository, in the order of `repo_names`,
+    and files in walk order. Repositories that can't be checked out are
+    reported and skipped. A ParseCache passed as `cache` is shared by all
+    repositories; the caller saves it once the run is over.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # Fork the workers (all created on the first submit) before any clone thread runs:
+        # a child forked while another thread holds a lock can hang forever
+        executor.submit(os.getpid).result()
+        with ThreadPoolExecutor(max_workers=CLONE_CONCURRENCY) as cloner:
+            yield from _analyze_repositories(repo_names, extensions, workdir, token, jobs, cache, executor, cloner)
+
+def _analyze_repositories(repo_names, extensions, workdir, token, jobs, cache, executor, cloner):
+    pending = deque()
+
+    def analyze(repo_name, future):
+        try:
+            path, branch = future.result()
+        except RuntimeError as e:
+            print(f"Skipping repository {repo_name}: {e}")
+            return
+        for file_path, rows, content_hash in parse_files(find_files(path, extensions), jobs, cache, executor):
+            yield repo_name, branch, path, file_path, rows, content_hash
+
+    for repo_name in repo_names:
+        pending.append((repo_name, cloner.submit(checkout_repository, repo_name, extensions, workdir, token)))
+        if len(pending) > CLONE_CONCURRENCY:
+            yield from analyze(*pending.popleft())
+    while pending:
+        yield from analyze(*pending.popleft())
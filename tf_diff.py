@@ -0,0 +1,85 @@
+import argparse
+import csv
+import time
+
+from git_utils import diff_trees, iter_blobs
+from hcl_parser import parse_hcl
+from tf_analysis import row_key
+
+DEFAULT_DIFF_CSV = "terraform_diff.csv"
+
+TERRAFORM_EXTENSIONS = ('.tf', '.tfvars')
+
+def _rows_by_key(data):
+    rows = {}
+    for row in parse_hcl(data) if data is not None else []:
+        rows.setdefault(row_key(row), []).append(row)
+    return rows
+
+def diff_rows(old_data, new_data):
+    """Yield (change, (type, name, attribute), old value, new value) between two versions of a file.
+
+    Repeated attributes (e.g. several `ingress` blocks) are paired in source
+    order. `change` is 'added', 'removed' or 'changed'; unchanged values are
+    not reported.
+    """
+    old_rows = _rows_by_key(old_data)
+    new_rows = _rows_by_key(new_data)
+    # Keys in the order they appear in the new file, then those only in the old one
+    for key in list(new_rows) + [key for key in old_rows if key not in new_rows]:
+        old_values = [row.value for row in old_rows.get(key, [])]
+        new_values = [row.value for row in new_rows.get(key, [])]
+        for index in range(max(len(old_values), len(new_values))):
+            if index >= len(old_values):
+                yield 'added', key, None, new_values[index]
+            elif index >= len(new_values):
+                yield 'removed', key, old_values[index], None
+            elif old_values[index] != new_values[index]:
+                yield 'changed', key, old_values[index], new_values[index]
+
+def diff_revisions(path, old_rev, new_rev, old_path=None, extensions=TERRAFORM_EXTENSIONS):
+    """Yield (file path, change, key, old value, new value) for the Terraform values that differ between two revisions.
+
+    Only the files git reports as changed are looked at, and their two
+    versions are read straight from the object database (no checkout) and
+    parsed in memory. With `old_path`, `old_rev` is a revision of that other
+    repository, e.g. the source of a migration compared with its target.
+    """
+    changed = [(old_sha, new_sha, file_path) for old_sha, new_sha, file_path in diff_trees(path, old_rev, new_rev, old_path)
+               if file_path.endswith(extensions)]
+    old_blobs = dict(iter_blobs(old_path or path, [old_sha for old_sha, _, _ in changed if old_sha]))
+    new_blobs = dict(iter_blobs(path, [new_sha for _, new_sha, _ in changed if new_sha]))
+    for old_sha, new_sha, file_path in changed:
+        for change, key, old_value, new_value in diff_rows(old_blobs.get(old_sha), new_blobs.get(new_sha)):
+            yield file_path, change, key, old_value, new_value
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the Terraform values added, removed or changed between two git revisions.')
+    parser.add_argument('old', nargs='?', help='Old revision (defaults to HEAD~1, or to HEAD of --source-repo)')
+    parser.add_argument('new', nargs='?', default='HEAD', help='New revision (defaults to HEAD)')
+    parser.add_argument('--repo', default='.', help='Repository or mirror holding the new revision (and the old one, without --source-repo)')
+    parser.add_argument('--source-repo', help='Repository or mirror holding the old revision, e.g. the source of a migration')
+    parser.add_argument('--output', default=DEFAULT_DIFF_CSV, help='CSV file to write the differences to')
+    args = parser.parse_args()
+    if args.old is None:
+        # Within one repository, show the last commit; across repositories, compare their heads
+        args.old = 'HEAD' if args.source_repo else 'HEAD~1'
+
+    started = time.monotonic()
+    counts = {}
+    try:
+        with open(args.output, 'w', newline='') as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(['Change', 'File Path', 'Type', 'Name', 'Attribute', 'Old Value', 'New Value'])
+            for file_path, change, key, old_value, new_value in diff_revisions(args.repo, args.old, args.new, args.source_repo):
+                counts[change] = counts.get(change, 0) + 1
+                writer.writerow([change, file_path, *key, old_value, new_value])
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return
+    print(f"Added: {counts.get('added', 0)}, removed: {counts.get('removed', 0)}, changed: {counts.get('changed', 0)} "
+          f"in {time.monotonic() - started:.1f}s")
+    print(f"Differences written to {args.output}")
+
+if __name__ == '__main__':
+    main()
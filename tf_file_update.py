@@ -1,138 +1,205 @@
 import ast
 import csv
-import re
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
-def process_updates_from_csv(csv_file_path):
+from hcl_parser import HclValue, parse_hcl
+from tf_analysis import file_hash, row_key
+
+update_summary_csv = 'terraform_update_summary.csv'
+
+def parse_new_value(new_value):
+    """Convert a 'New Value' cell to the appropriate type."""
+    try:
+        # First, try to evaluate as a Python literal
+        new_value = ast.literal_eval(new_value)
+    except (ValueError, SyntaxError):
+        # If it's not a Python literal, keep it as a string
+        pass
+
+    # Special handling for boolean values
+    if isinstance(new_value, str):
+        lower_value = new_value.lower()
+        if lower_value == 'true':
+            new_value = True
+        elif lower_value == 'false':
+            new_value = False
+    return new_value
+
+def format_new_value(current_value, new_value):
+    """Render a new value as HCL source, keeping the current value quoted if it was a string."""
+    if isinstance(new_value, bool):
+        return 'true' if new_value else 'false'
+    if isinstance(new_value, (list, tuple, dict)):
+        return json.dumps(new_value)
+    if current_value.startswith('"'):
+        return f'"{new_value}"'
+    return str(new_value)
+
+def read_span(row):
+    """Return the (start, end) byte span recorded for a value by the analysis scripts, or None."""
+    try:
+        return int(row['Value Start']), int(row['Value End'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def read_updates_from_csv(csv_file_path):
+    """Return the pending edits of the CSV grouped by file: {file path: [edit]}, in CSV order."""
+    edits_by_file = {}
     with open(csv_file_path, mode='r', encoding='utf-8-sig') as csvfile:
         csv_reader = csv.DictReader(csvfile)
-        
-        # Get the headers
-        headers = csv_reader.fieldnames
-        
+
         # Check if required columns exist
+        headers = csv_reader.fieldnames or []
         required_columns = ["File Path", "Value", "New Value"]
         for column in required_columns:
             if column not in headers:
                 print(f"Error: '{column}' column not found in the CSV file.")
-                return
-
-        # Skip the header row
-        next(csv_reader)
+                return None
 
-        # Process each row
         for row in csv_reader:
             terraform_file_path = row["File Path"]
-        
+
             if not terraform_file_path:
                 print("Error: Terraform file path is empty in the CSV file.")
                 continue
-            
-            block_type = row['Type']
-            block_name = row['Name']
-            attribute_name = row['Attribute']
-            old_value = row['Value']
-            new_value = row['New Value']
-            
+
             # Skip if New Value is empty
-            if not new_value:
+            if not row['New Value']:
                 continue
-            
-            # Try to convert new_value to the appropriate type
-            try:
-                # First, try to evaluate as a Python literal
-                new_value = ast.literal_eval(new_value)
-            except (ValueError, SyntaxError):
-                # If it's not a Python literal, keep it as a string
-                pass
-            
-            # Special handling for boolean values
-            if isinstance(new_value, str):
-                lower_value = new_value.lower()
-                if lower_value == 'true':
-                    new_value = True
-                elif lower_value == 'false':
-                    new_value = False
-            
-            update_terraform_attribute(terraform_file_path, block_type, block_name, attribute_name, new_value)
-            
-            # Format new_value for consistent output
-            new_value_formatted = f'"{new_value}"' if isinstance(new_value, str) and old_value.startswith('"') and old_value.endswith('"') else new_value
-            
-            print(f"Updated attribute '{attribute_name}' in {terraform_file_path}")
-            print(f"  Old value: {old_value}")
-            print(f"  New value: {new_value_formatted}")
-            print()
-
-def update_terraform_attribute(file_path, block_type, block_name, attribute_name, new_value):
-    # Open the original Terraform file for reading
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-
-    # Flag to track if we are inside the correct block
-    inside_block = False
-    updated_lines = []
-
-    # Regex patterns to identify the block and the attribute types
-    block_pattern = re.compile(rf'{block_type}\s+"{block_name}"\s+{{')
-    attribute_pattern_string = re.compile(rf'\s*{attribute_name}\s*=\s*".*"')
-    attribute_pattern_number = re.compile(rf'\s*{attribute_name}\s*=\s*\d+')
-    attribute_pattern_boolean = re.compile(rf'\s*{attribute_name}\s*=\s*(true|false)')
-    attribute_pattern_list_start = re.compile(rf'\s*{attribute_name}\s*=\s*\[.*')
-    list_terminator = re.compile(r'.*\]')
-    
-    # Iterate through each line of the file
-    for line in lines:
-        # Check if we are entering the desired block (provider, resource, variable, etc.)
-        if block_pattern.search(line):
-            inside_block = True
-            updated_lines.append(line)
+
+            edits_by_file.setdefault(terraform_file_path, []).append({
+                'Type': row['Type'],
+                'Name': row['Name'],
+                'Attribute': row['Attribute'],
+                'Old Value': row['Value'],
+                'New Value': parse_new_value(row['New Value']),
+                'Span': read_span(row),
+                'File Hash': row.get('File Hash') or None
+            })
+    return edits_by_file
+
+def write_atomically(file_path, data):
+    """Replace a file's content through a temporary file and a rename, keeping its permissions."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def apply_file_edits(file_path, edits):
+    """Apply all the edits of one file in a single pass and write it back once.
+
+    While the file still has the content hash recorded by the analysis, each
+    value is located directly by its recorded byte span, so the edit hits the
+    exact occurrence the analysis row referred to. Otherwise (the file changed
+    since, or the CSV has no spans) the file is parsed once to locate every
+    (Type, Name, Attribute). The new values are spliced in and the result
+    replaces the file atomically. Returns the edits, each with its 'Status'
+    (applied, unmatched, or superseded by a later edit of the same value) and
+    the 'Written Value'.
+    """
+    try:
+        with open(file_path, 'rb') as file:
+            data = file.read()
+    except OSError as e:
+        for edit in edits:
+            edit['Status'] = f'error: {e}'
+        return edits
+
+    content_hash = file_hash(data)
+    rows_by_key = None
+
+    def locate(edit):
+        nonlocal rows_by_key
+        if edit['Span'] is not None and edit['File Hash'] == content_hash:
+            start, end = edit['Span']
+            value = data[start:end].decode('utf-8', 'replace')
+            # Guard against a CSV edited by hand: the span must still hold the analysed value
+            if value == edit['Old Value']:
+                return HclValue(edit['Type'], edit['Name'], edit['Attribute'], value, start, end)
+        if rows_by_key is None:
+            rows_by_key = {}
+            for row in parse_hcl(data):
+                rows_by_key.setdefault(row_key(row), []).append(row)
+        # Prefer the occurrence still holding the analysed value, then the first one
+        candidates = rows_by_key.get((edit['Type'], edit['Name'], edit['Attribute']), [])
+        return next((row for row in candidates if row.value == edit['Old Value']), candidates[0] if candidates else None)
+
+    # Edits by span start; a later edit of the same value supersedes an earlier one
+    splices = {}
+    for edit in edits:
+        row = locate(edit)
+        if row is None:
+            edit['Status'] = 'unmatched'
             continue
+        edit['Written Value'] = format_new_value(row.value, edit['New Value'])
+        edit['Status'] = 'applied'
+        if row.start in splices:
+            splices[row.start][1]['Status'] = 'superseded'
+        splices[row.start] = (row, edit)
 
-        # If we are inside the block, check if the line contains the attribute to be updated
-        if inside_block:
-            # Check for string attribute
-            if attribute_pattern_string.search(line):
-                # If the attribute is a string, update its value
-                updated_line = attribute_pattern_string.sub(f'  {attribute_name} = "{new_value}"', line)
-                updated_lines.append(updated_line)
-                continue
-            # Check for number attribute
-            elif attribute_pattern_number.search(line):
-                # If the attribute is a number, update its value
-                updated_line = attribute_pattern_number.sub(f'  {attribute_name} = {new_value}', line)
-                updated_lines.append(updated_line)
-                continue
-            # Check for boolean attribute
-            elif attribute_pattern_boolean.search(line):
-                updated_line = attribute_pattern_boolean.sub(f'  {attribute_name} = {str(new_value).lower()}', line)
-                updated_lines.append(updated_line)
-                continue
-            # Check for list attribute
-            elif attribute_pattern_list_start.search(line):
-                # If the attribute is a list and it spans multiple lines, handle it accordingly
-                if not list_terminator.search(line):  # Check if list is multi-line
-                    updated_lines.append(f'  {attribute_name} = {new_value}\n')
-                    inside_block = False
-                    continue
-                else:
-                    # Update a single-line list
-                    updated_line = attribute_pattern_list_start.sub(f'  {attribute_name} = {new_value}', line)
-                    updated_lines.append(updated_line)
-                    continue
-
-        # Add the line to the updated list if no changes are made
-        updated_lines.append(line)
-
-        # Check for the end of the block
-        if inside_block and line.strip() == "}":
-            inside_block = False
-
-    # Write the updated lines back to the file (preserving the exact structure)
-    with open(file_path, 'w') as file:
-        file.writelines(updated_lines)
+    if splices:
+        parts = []
+        position = 0
+        for start in sorted(splices):
+            row, edit = splices[start]
+            parts.append(data[position:row.start])
+            parts.append(edit['Written Value'].encode('utf-8'))
+            position = row.end
+        parts.append(data[position:])
+        try:
+            write_atomically(file_path, b''.join(parts))
+        except OSError as e:
+            for row, edit in splices.values():
+                edit['Status'] = f'error: {e}'
+    return edits
+
+def process_updates_from_csv(csv_file_path, summary_csv_path=update_summary_csv, jobs=None):
+    edits_by_file = read_updates_from_csv(csv_file_path)
+    if edits_by_file is None:
+        return
+
+    fieldnames = ['File Path', 'Type', 'Name', 'Attribute', 'Old Value', 'New Value', 'Status']
+    counts = {}
+    with open(summary_csv_path, 'w', newline='') as summary_file, \
+            ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        writer = csv.DictWriter(summary_file, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+
+        # Files are independent, so each one is edited in its own worker
+        file_paths = list(edits_by_file)
+        for terraform_file_path, edits in zip(file_paths, executor.map(apply_file_edits, file_paths,
+                                                                       [edits_by_file[path] for path in file_paths])):
+            for edit in edits:
+                status = edit['Status']
+                counts[status] = counts.get(status, 0) + 1
+                if status == 'applied':
+                    print(f"Updated attribute '{edit['Attribute']}' in {terraform_file_path}")
+                    print(f"  Old value: {edit['Old Value']}")
+                    print(f"  New value: {edit['Written Value']}")
+                    print()
+                elif status == 'unmatched':
+                    print(f"Attribute not found: {terraform_file_path}, Type: {edit['Type']}, Name: {edit['Name']}, Attribute: {edit['Attribute']}")
+                elif status != 'superseded':
+                    print(f"Could not update {terraform_file_path}: {status}")
+                writer.writerow(dict(edit, **{'File Path': terraform_file_path, 'New Value': edit.get('Written Value', edit['New Value'])}))
+
+    print(f"Edits applied: {counts.pop('applied', 0)}, unmatched: {counts.pop('unmatched', 0)}, "
+          f"superseded: {counts.pop('superseded', 0)}, failed: {sum(counts.values())}")
+    print(f"Summary written to {summary_csv_path}")
 
 
 # --- main program starts ---
 
-csv_file_path = 'terraform_parsed_results.csv'  # Path to your CSV file
-process_updates_from_csv(csv_file_path)
\ No newline at end of file
+if __name__ == '__main__':
+    csv_file_path = 'terraform_parsed_results.csv'  # Path to your CSV file
+    process_updates_from_csv(csv_file_path)
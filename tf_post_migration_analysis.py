@@ -1,27 +1,44 @@
 import csv
-import re
 
-def read_attribute_from_file(file_path, type_value, name, attribute):
-    try:
-        with open(file_path, 'r') as file:
-            content = file.read()
-            # Create a pattern to match Type, Name, and Attribute
-            pattern = rf'{re.escape(type_value)}\s+"{re.escape(name)}"\s+{{[^}}]*{re.escape(attribute)}\s*=\s*([^,\n]+)'
-            match = re.search(pattern, content, re.IGNORECASE | re.MULTILINE)
-            if match:
-                return match.group(1).strip()  # Return the captured value
-        return None  # Return None if no match is found
-    except FileNotFoundError:
-        print(f"File not found: {file_path}")
-    except Exception as e:
-        print(f"Error reading file {file_path}: {str(e)}")
-    return None
+from hcl_parser import parse_hcl_file
+from tf_analysis import row_key
+
+def build_attribute_index(file_path):
+    """Parse a Terraform file once and index its values by lowercased (type, name, attribute).
+
+    Top-level attributes (.tfvars files) are indexed as ('tfvars', name, 'value'),
+    like the analysis scripts report them. When a key repeats, the first value wins.
+    """
+    index = {}
+    for row in parse_hcl_file(file_path):
+        index.setdefault(tuple(part.lower() for part in row_key(row)), row.value)
+    return index
+
+def read_attribute_from_file(file_indexes, file_path, type_value, name, attribute):
+    """Look an attribute up in the index of its file, parsing the file on first use."""
+    index = file_indexes.get(file_path)
+    if index is None:
+        try:
+            index = build_attribute_index(file_path)
+        except FileNotFoundError:
+            print(f"File not found: {file_path}")
+            index = {}
+        except Exception as e:
+            print(f"Error reading file {file_path}: {str(e)}")
+            index = {}
+        file_indexes[file_path] = index
+    return index.get((type_value.lower(), name.lower(), attribute.lower()))
 
 def process_csv(input_csv_file, output_csv_file):
-    results = []
-    
-    with open(input_csv_file, 'r') as file:
+    # Each file is parsed once, however many rows refer to it
+    file_indexes = {}
+
+    fieldnames = ['File Path', 'Type', 'Name', 'Attribute', 'Current Value in .tf File',
+                  'New Value as Specified in the CSV File', 'Result']
+    with open(input_csv_file, 'r') as file, open(output_csv_file, 'w', newline='') as output:
         csv_reader = csv.DictReader(file)
+        writer = csv.DictWriter(output, fieldnames=fieldnames)
+        writer.writeheader()
         
         for row in csv_reader:
             new_value = row['New Value'].strip()
@@ -35,7 +52,7 @@ def process_csv(input_csv_file, output_csv_file):
             name = row['Name']
             attribute = row['Attribute']
             
-            current_value = read_attribute_from_file(file_path, type_value, name, attribute)
+            current_value = read_attribute_from_file(file_indexes, file_path, type_value, name, attribute)
             
             if current_value is not None:
                 print(f"File: {file_path}")
@@ -54,7 +71,8 @@ def process_csv(input_csv_file, output_csv_file):
                 
                 print("-" * 40)  # Separator for readability
                 
-                results.append({
+                # Stream the result to the output file
+                writer.writerow({
                     'File Path': file_path,
                     'Type': type_value,
                     'Name': name,
@@ -68,19 +86,10 @@ def process_csv(input_csv_file, output_csv_file):
                 print(f"File: {file_path}, Type: {type_value}, Name: {name}, Attribute: {attribute}")
                 print("-" * 40)  # Separator for readability
 
-    # Write results to output CSV file
-    with open(output_csv_file, 'w', newline='') as file:
-        fieldnames = ['File Path', 'Type', 'Name', 'Attribute', 'Current Value in .tf File', 
-                      'New Value as Specified in the CSV File', 'Result']
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        
-        writer.writeheader()
-        for result in results:
-            writer.writerow(result)
-
     print(f"Results have been written to {output_csv_file}")
 
-# Usage
-input_csv_file = 'terraform_parsed_results.csv'
-output_csv_file = 'terraform_comparison_summary.csv'
-process_csv(input_csv_file, output_csv_file)
+if __name__ == '__main__':
+    # Usage
+    input_csv_file = 'terraform_parsed_results.csv'
+    output_csv_file = 'terraform_comparison_summary.csv'
+    process_csv(input_csv_file, output_csv_file)
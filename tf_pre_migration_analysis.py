@@ -1,58 +1,24 @@
-import re
+import argparse
 import csv
 import os
 import subprocess
 import sys
 
-def parse_terraform_file(file_path):
-    with open(file_path, 'r') as file:
-        content = file.read()
-
-    variable_block_pattern = r'variable\s+"(\w+)"\s+{([^}]*)}'
-    provider_block_pattern = r'provider\s+"(\w+)"\s+{([^}]*)}'
-    attribute_pattern = r'(\w+)\s*=\s*(.+)'
-
-    variables = {}
-    providers = {}
-
-    for match in re.finditer(variable_block_pattern, content, re.DOTALL):
-        var_name, var_content = match.groups()
-        var_attributes = {}
-        for attr_match in re.finditer(attribute_pattern, var_content):
-            attr_name, attr_value = attr_match.groups()
-            # Remove everything after and including '#'
-            attr_value = attr_value.split('#')[0].strip()
-            # Preserve quotes if they exist
-            if attr_value.startswith('"') and attr_value.endswith('"'):
-                var_attributes[attr_name.strip()] = attr_value
-            else:
-                var_attributes[attr_name.strip()] = attr_value.strip('"')
-        variables[var_name] = var_attributes
-
-    for match in re.finditer(provider_block_pattern, content, re.DOTALL):
-        provider_name, provider_content = match.groups()
-        provider_attributes = {}
-        for attr_match in re.finditer(attribute_pattern, provider_content):
-            attr_name, attr_value = attr_match.groups()
-            # Remove everything after and including '#'
-            attr_value = attr_value.split('#')[0].strip()
-            # Preserve quotes if they exist
-            if attr_value.startswith('"') and attr_value.endswith('"'):
-                provider_attributes[attr_name.strip()] = attr_value
-            else:
-                provider_attributes[attr_name.strip()] = attr_value.strip('"')
-        providers[provider_name] = provider_attributes
+from hcl_parser import parse_hcl_file
+from repo_discovery import add_discovery_arguments, discover_repositories
+from tf_analysis import DEFAULT_CHECKOUT_DIR, ParseCache, analyze_repositories, find_files, parse_files, read_repo_list
+
+def select_rows(rows):
+    """Keep the variable and provider attributes of parsed HclValue rows."""
+    return [row for row in rows if row.type in ('variable', 'provider')]
 
+def parse_terraform_file(file_path):
+    """Return the variable and provider attributes of a Terraform file as HclValue rows."""
     # Return the full file_path instead of os.path.basename(file_path)
-    return file_path, variables, providers
+    return file_path, select_rows(parse_hcl_file(file_path))
 
 def find_tf_files(directory):
-    tf_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.tf'):
-                tf_files.append(os.path.join(root, file))
-    return tf_files
+    return find_files(directory, ('.tf',))
 
 def ensure_repo_exists(repo_url, local_path):
     if not os.path.exists(local_path):
@@ -69,64 +35,83 @@ def ensure_repo_exists(repo_url, local_path):
 def get_repo_relative_path(full_path, repo_path):
     return os.path.relpath(full_path, repo_path)
 
-# GitHub repository URL and local path
-github_repo_url = "https://github.com/Test-Org-0101/aws-terraform-1.git"
-local_repo_path = './aws-terraform-1'  # Change this to your desired local path
-
-# Ensure the repository exists locally
-ensure_repo_exists(github_repo_url, local_repo_path)
-
-# Update the terraform_directory to use the local repository path
-terraform_directory = local_repo_path
-
-# Extract repository name and owner from github_repo_url
-repo_parts = github_repo_url.split('/')
-repo_owner = repo_parts[-2]
-repo_name = repo_parts[-1].replace('.git', '')
-
-# Base GitHub URL
-github_base_url = f"https://github.com/{repo_owner}/{repo_name}/blob/main/"
-
-# Find all .tf files
-tf_files = find_tf_files(terraform_directory)
-
-# Prepare to store results
-all_results = []
-
-# Parse each .tf file
-for file_path in tf_files:
-    # Get the relative path of the file within the repository
-    relative_path = get_repo_relative_path(file_path, terraform_directory)
-    
-    # Construct the full GitHub URL for this file
-    file_github_url = github_base_url + relative_path.replace('\\', '/')
-    
-    # Combine repository name and relative path
-    repo_and_path = f"{repo_name}\{relative_path}"
-    
-    full_file_path, parsed_variables, parsed_providers = parse_terraform_file(file_path)
-    
-    # Store results for variables
-    for var_name, var_attributes in parsed_variables.items():
-        for attr_name, attr_value in var_attributes.items():
-            all_results.append([file_github_url, repo_and_path, 'variable', var_name, attr_name, attr_value])
-    
-    # Store results for providers
-    for provider_name, provider_attributes in parsed_providers.items():
-        for attr_name, attr_value in provider_attributes.items():
-            all_results.append([file_github_url, repo_and_path, 'provider', provider_name, attr_name, attr_value])
-
-
-# Write the results to a CSV file
-output_file = 'terraform_parsed_results.csv'
-
-with open(output_file, 'w', newline='') as csvfile:
-    csvwriter = csv.writer(csvfile)
-    
-    # Write header
-    csvwriter.writerow(['GitHub URL', 'File Path', 'Type', 'Name', 'Attribute', 'Value'])
-    
-    # Write all results
-    csvwriter.writerows(all_results)
-
-print(f"Results have been written to {output_file}")
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description='Extract the variable and provider attributes of Terraform files to CSV.')
+    parser.add_argument('--repos', nargs='+', help='Analyse these org/repo repositories instead of the default one')
+    parser.add_argument('--repos-file', help='File listing org/repo repositories to analyse, one per line (like source_repos.csv)')
+    add_discovery_arguments(parser, org_help='Analyse every repository of this organization')
+    parser.add_argument('-t', '--token', default=os.getenv('GITHUB_TOKEN'), help='GitHub access token (defaults to GITHUB_TOKEN)')
+    parser.add_argument('--workdir', default=DEFAULT_CHECKOUT_DIR, help='Directory holding the sparse checkouts of the analysed repositories')
+    parser.add_argument('--jobs', type=int, help='Number of parsing processes (defaults to the CPU count)')
+    parser.add_argument('--output', default='terraform_parsed_results.csv', help='CSV file receiving the results')
+    args = parser.parse_args()
+
+    # Multi-repository mode: only the .tf files of each repository are fetched
+    if args.org:
+        repo_names = (record['full_name'] for record in discover_repositories(args, token=args.token))
+    elif args.repos or args.repos_file:
+        repo_names = list(args.repos or []) + (read_repo_list(args.repos_file) if args.repos_file else [])
+    else:
+        repo_names = None
+
+    # Write the results to a CSV file
+    output_file = args.output
+
+    # The parse cache index is saved once, when the run ends
+    with open(output_file, 'w', newline='') as csvfile, ParseCache() as parse_cache:
+        csvwriter = csv.writer(csvfile)
+
+        # Write header
+        csvwriter.writerow(['Repository', 'GitHub URL', 'File Path', 'Type', 'Name', 'Attribute', 'Value', 'Value Start', 'Value End', 'File Hash'])
+
+        def write_rows(repo, file_github_url, repo_and_path, file_path, parsed_rows, content_hash):
+            # Store results for variables and providers
+            # The byte span of each value and the hash of the file let tf_file_update.py edit values in place
+            csvwriter.writerows([repo, file_github_url, repo_and_path, row.type, row.name, row.attribute, row.value,
+                                 row.start, row.end, content_hash]
+                                for row in select_rows(parsed_rows))
+
+        if repo_names is not None:
+            for repo, branch, repo_path, file_path, parsed_rows, content_hash in analyze_repositories(
+                    repo_names, ('.tf',), args.workdir, args.token, args.jobs, parse_cache):
+                relative_path = get_repo_relative_path(file_path, repo_path).replace('\\', '/')
+                file_github_url = f"https://github.com/{repo}/blob/{branch}/{relative_path}"
+                # The local path of the checkout, so the other tf_ scripts can open the file
+                write_rows(repo, file_github_url, file_path, file_path, parsed_rows, content_hash)
+        else:
+            # GitHub repository URL and local path
+            github_repo_url = "https://github.com/Test-Org-0101/aws-terraform-1.git"
+            local_repo_path = './aws-terraform-1'  # Change this to your desired local path
+
+            # Ensure the repository exists locally
+            ensure_repo_exists(github_repo_url, local_repo_path)
+
+            # Update the terraform_directory to use the local repository path
+            terraform_directory = local_repo_path
+
+            # Extract repository name and owner from github_repo_url
+            repo_parts = github_repo_url.split('/')
+            repo_owner = repo_parts[-2]
+            repo_name = repo_parts[-1].replace('.git', '')
+
+            # Base GitHub URL
+            github_base_url = f"https://github.com/{repo_owner}/{repo_name}/blob/main/"
+
+            # Parse the .tf files across a process pool, reusing the cached rows of unchanged files;
+            # rows are written file by file, in walk order
+            for file_path, parsed_rows, content_hash in parse_files(find_tf_files(terraform_directory), jobs=args.jobs, cache=parse_cache):
+                # Get the relative path of the file within the repository
+                relative_path = get_repo_relative_path(file_path, terraform_directory)
+
+                # Construct the full GitHub URL for this file
+                file_github_url = github_base_url + relative_path.replace('\\', '/')
+
+                # Combine repository name and relative path
+                repo_and_path = f"{repo_name}\\{relative_path}"
+
+                write_rows(f"{repo_owner}/{repo_name}", file_github_url, repo_and_path, file_path, parsed_rows, content_hash)
+
+    print(f"Results have been written to {output_file}")
+
+if __name__ == '__main__':
+    main()
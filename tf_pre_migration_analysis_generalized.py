@@ -1,70 +1,39 @@
-import re
+import argparse
 import csv
 import os
 import subprocess
 import sys
 
-def parse_terraform_file(file_path):
-    with open(file_path, 'r') as file:
-        content = file.read()
-
-    # Pattern for blocks with one or two quoted values
-    block_pattern = r'(\w+)\s+"([^"]+)"(?:\s+"([^"]+)")?\s*{([^}]*)}'
-    attribute_pattern = r'(\w+)\s*=\s*(.+)'
-
-    blocks = {}
-
-    for match in re.finditer(block_pattern, content, re.DOTALL):
-        block_type, block_name1, block_name2, block_content = match.groups()
-        block_attributes = {}
-        for attr_match in re.finditer(attribute_pattern, block_content):
-            attr_name, attr_value = attr_match.groups()
-            # Remove everything after and including '#'
-            attr_value = attr_value.split('#')[0].strip()
-            # Preserve quotes if they exist
-            if attr_value.startswith('"') and attr_value.endswith('"'):
-                block_attributes[attr_name.strip()] = attr_value
-            else:
-                block_attributes[attr_name.strip()] = attr_value.strip('"')
-        
-        # Determine the block name based on whether it has one or two quoted values
-        if block_name2:
-            combined_name = f"{block_name1}/{block_name2}"
-        else:
-            combined_name = block_name1
+from hcl_parser import parse_hcl_file
+from repo_discovery import add_discovery_arguments, discover_repositories
+from tf_analysis import DEFAULT_CHECKOUT_DIR, ParseCache, analyze_repositories, find_files, parse_files, read_repo_list
 
-        if block_type not in blocks:
-            blocks[block_type] = {}
-        blocks[block_type][combined_name] = block_attributes
+def terraform_rows(rows):
+    """Keep the block attributes of parsed HclValue rows.
 
-    return file_path, blocks
+    Blocks with two labels are named "label1/label2"; attributes of nested
+    blocks are dotted ("lifecycle.prevent_destroy").
+    """
+    return [row for row in rows if row.type is not None]
 
-def parse_tfvars_file(file_path):
-    with open(file_path, 'r') as file:
-        content = file.read()
-
-    tfvars_pattern = r'(\w+)\s*=\s*(.+)'
-    tfvars = {}
-
-    for match in re.finditer(tfvars_pattern, content):
-        var_name, var_value = match.groups()
-        # Remove everything after and including '#'
-        var_value = var_value.split('#')[0].strip()
-        # Preserve quotes if they exist
-        if var_value.startswith('"') and var_value.endswith('"'):
-            tfvars[var_name.strip()] = var_value
-        else:
-            tfvars[var_name.strip()] = var_value.strip('"')
+def tfvars_rows(rows):
+    """Turn the top-level attributes of a parsed .tfvars file into ('tfvars', name, 'value', value) rows."""
+    return [row._replace(type='tfvars', name=row.attribute, attribute='value') for row in rows if row.type is None]
+
+def select_rows(file_path, rows):
+    """Select the rows reported for a parsed .tf or .tfvars file according to its extension."""
+    return tfvars_rows(rows) if file_path.endswith('.tfvars') else terraform_rows(rows)
 
-    return file_path, tfvars
+def parse_terraform_file(file_path):
+    """Return the attributes of every block of a Terraform file as HclValue rows."""
+    return file_path, terraform_rows(parse_hcl_file(file_path))
+
+def parse_tfvars_file(file_path):
+    """Return the variables set in a .tfvars file as HclValue rows."""
+    return file_path, tfvars_rows(parse_hcl_file(file_path))
 
 def find_tf_and_tfvars_files(directory):
-    files = []
-    for root, dirs, filenames in os.walk(directory):
-        for file in filenames:
-            if file.endswith('.tf') or file.endswith('.tfvars'):
-                files.append(os.path.join(root, file))
-    return files
+    return find_files(directory, ('.tf', '.tfvars'))
 
 def ensure_repo_exists(repo_url, local_path):
     if not os.path.exists(local_path):
@@ -81,67 +50,83 @@ def ensure_repo_exists(repo_url, local_path):
 def get_repo_relative_path(full_path, repo_path):
     return os.path.relpath(full_path, repo_path)
 
-# GitHub repository URL and local path
-github_repo_url = "https://github.com/Test-Org-0101/aws-terraform-1.git"
-local_repo_path = './aws-terraform-1'  # Change this to your desired local path
-
-# Ensure the repository exists locally
-ensure_repo_exists(github_repo_url, local_repo_path)
-
-# Update the terraform_directory to use the local repository path
-terraform_directory = local_repo_path
-
-# Extract repository name and owner from github_repo_url
-repo_parts = github_repo_url.split('/')
-repo_owner = repo_parts[-2]
-repo_name = repo_parts[-1].replace('.git', '')
-
-# Base GitHub URL
-github_base_url = f"https://github.com/{repo_owner}/{repo_name}/blob/main/"
-
-# Find all .tf and .tfvars files
-all_files = find_tf_and_tfvars_files(terraform_directory)
-
-# Prepare to store results
-all_results = []
-
-# Parse each file
-for file_path in all_files:
-    # Get the relative path of the file within the repository
-    relative_path = get_repo_relative_path(file_path, terraform_directory)
-    
-    # Construct the full GitHub URL for this file
-    file_github_url = github_base_url + relative_path.replace('\\', '/')
-    
-    # Combine repository name and relative path
-    repo_and_path = f"{repo_name}\{relative_path}"
-    
-    if file_path.endswith('.tf'):
-        full_file_path, parsed_blocks = parse_terraform_file(file_path)
-        
-        # Store results for all block types
-        for block_type, blocks in parsed_blocks.items():
-            for block_name, block_attributes in blocks.items():
-                for attr_name, attr_value in block_attributes.items():
-                    all_results.append([file_github_url, repo_and_path, block_type, block_name, attr_name, attr_value])
-    
-    elif file_path.endswith('.tfvars'):
-        full_file_path, parsed_tfvars = parse_tfvars_file(file_path)
-        
-        # Store results for tfvars
-        for var_name, var_value in parsed_tfvars.items():
-            all_results.append([file_github_url, repo_and_path, 'tfvars', var_name, 'value', var_value])
-
-# Write the results to a CSV file
-output_file = 'terraform_parsed_results_generalized_1.csv'
-
-with open(output_file, 'w', newline='') as csvfile:
-    csvwriter = csv.writer(csvfile)
-    
-    # Write header
-    csvwriter.writerow(['GitHub URL', 'File Path', 'Type', 'Name', 'Attribute', 'Value'])
-    
-    # Write all results
-    csvwriter.writerows(all_results)
-
-print(f"Results have been written to {output_file}")
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description='Extract the block attributes of Terraform files and the variables of .tfvars files to CSV.')
+    parser.add_argument('--repos', nargs='+', help='Analyse these org/repo repositories instead of the default one')
+    parser.add_argument('--repos-file', help='File listing org/repo repositories to analyse, one per line (like source_repos.csv)')
+    add_discovery_arguments(parser, org_help='Analyse every repository of this organization')
+    parser.add_argument('-t', '--token', default=os.getenv('GITHUB_TOKEN'), help='GitHub access token (defaults to GITHUB_TOKEN)')
+    parser.add_argument('--workdir', default=DEFAULT_CHECKOUT_DIR, help='Directory holding the sparse checkouts of the analysed repositories')
+    parser.add_argument('--jobs', type=int, help='Number of parsing processes (defaults to the CPU count)')
+    parser.add_argument('--output', default='terraform_parsed_results_generalized_1.csv', help='CSV file receiving the results')
+    args = parser.parse_args()
+
+    # Multi-repository mode: only the .tf and .tfvars files of each repository are fetched
+    if args.org:
+        repo_names = (record['full_name'] for record in discover_repositories(args, token=args.token))
+    elif args.repos or args.repos_file:
+        repo_names = list(args.repos or []) + (read_repo_list(args.repos_file) if args.repos_file else [])
+    else:
+        repo_names = None
+
+    # Write the results to a CSV file
+    output_file = args.output
+
+    # The parse cache index is saved once, when the run ends
+    with open(output_file, 'w', newline='') as csvfile, ParseCache() as parse_cache:
+        csvwriter = csv.writer(csvfile)
+
+        # Write header
+        csvwriter.writerow(['Repository', 'GitHub URL', 'File Path', 'Type', 'Name', 'Attribute', 'Value', 'Value Start', 'Value End', 'File Hash'])
+
+        def write_rows(repo, file_github_url, repo_and_path, file_path, parsed_rows, content_hash):
+            # Store results for all block types and tfvars
+            # The byte span of each value and the hash of the file let tf_file_update.py edit values in place
+            csvwriter.writerows([repo, file_github_url, repo_and_path, row.type, row.name, row.attribute, row.value,
+                                 row.start, row.end, content_hash]
+                                for row in select_rows(file_path, parsed_rows))
+
+        if repo_names is not None:
+            for repo, branch, repo_path, file_path, parsed_rows, content_hash in analyze_repositories(
+                    repo_names, ('.tf', '.tfvars'), args.workdir, args.token, args.jobs, parse_cache):
+                relative_path = get_repo_relative_path(file_path, repo_path).replace('\\', '/')
+                file_github_url = f"https://github.com/{repo}/blob/{branch}/{relative_path}"
+                # The local path of the checkout, so the other tf_ scripts can open the file
+                write_rows(repo, file_github_url, file_path, file_path, parsed_rows, content_hash)
+        else:
+            # GitHub repository URL and local path
+            github_repo_url = "https://github.com/Test-Org-0101/aws-terraform-1.git"
+            local_repo_path = './aws-terraform-1'  # Change this to your desired local path
+
+            # Ensure the repository exists locally
+            ensure_repo_exists(github_repo_url, local_repo_path)
+
+            # Update the terraform_directory to use the local repository path
+            terraform_directory = local_repo_path
+
+            # Extract repository name and owner from github_repo_url
+            repo_parts = github_repo_url.split('/')
+            repo_owner = repo_parts[-2]
+            repo_name = repo_parts[-1].replace('.git', '')
+
+            # Base GitHub URL
+            github_base_url = f"https://github.com/{repo_owner}/{repo_name}/blob/main/"
+
+            # Parse the .tf and .tfvars files across a process pool, reusing the cached rows of unchanged files;
+            # rows are written file by file, in walk order
+            for file_path, parsed_rows, content_hash in parse_files(find_tf_and_tfvars_files(terraform_directory), jobs=args.jobs, cache=parse_cache):
+                # Get the relative path of the file within the repository
+                relative_path = get_repo_relative_path(file_path, terraform_directory)
+
+                # Construct the full GitHub URL for this file
+                file_github_url = github_base_url + relative_path.replace('\\', '/')
+
+                # Combine repository name and relative path
+                repo_and_path = f"{repo_name}\\{relative_path}"
+
+                write_rows(f"{repo_owner}/{repo_name}", file_github_url, repo_and_path, file_path, parsed_rows, content_hash)
+
+    print(f"Results have been written to {output_file}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import csv
+import re
+from array import array
+from collections import Counter
+
+# Columns of the analysis CSVs, in order
+RESULT_COLUMNS = ('Repository', 'GitHub URL', 'File Path', 'Type', 'Name', 'Attribute', 'Value', 'Value Start', 'Value End', 'File Hash')
+INTEGER_COLUMNS = ('Value Start', 'Value End')
+
+class _StringColumn:
+    """A dictionary-encoded string column: each distinct string is stored once, rows hold 4-byte codes."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+        self.data = array('I')
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, value):
+        self.data.append(self.encode(value))
+
+    def matching_codes(self, condition):
+        """Return the codes of the distinct values satisfying a condition (see ResultStore.where)."""
+        if callable(condition):
+            return {code for code, value in enumerate(self.values) if condition(value)}
+        if isinstance(condition, (set, frozenset, list, tuple)):
+            return {self.codes[value] for value in condition if value in self.codes}
+        return {self.codes[condition]} if condition in self.codes else set()
+
+class ResultStore:
+    """Parsed Terraform results held column by column.
+
+    The string columns are dictionary-encoded: a repository, URL, path,
+    type, name or value repeated on thousands of rows is stored once, and
+    each row only costs a 4-byte code per column (spans are 8-byte
+    integers). Filters and group-bys work on the codes, so a condition is
+    evaluated once per distinct value rather than once per row.
+    """
+
+    def __init__(self, extra_columns=()):
+        # Columns of the input beyond the analysis layout (e.g. "New Value") are kept as string columns
+        self.column_names = RESULT_COLUMNS + tuple(name for name in extra_columns if name not in RESULT_COLUMNS)
+        self.columns = {name: array('q') if name in INTEGER_COLUMNS else _StringColumn() for name in self.column_names}
+
+    def __len__(self):
+        return len(self.columns['Type'].data)
+
+    def append(self, row):
+        """Add one row given in the order of `column_names`; a span of None is stored as -1."""
+        for name, value in zip(self.column_names, row):
+            self.columns[name].append(-1 if value is None and name in INTEGER_COLUMNS else value)
+
+    @classmethod
+    def from_csv(cls, csv_file_path):
+        """Load a CSV written by the analysis scripts, with any extra columns it has.
+
+        Spans missing from older CSVs (or from rows without one) are held as -1
+        and read back as None.
+        """
+        with open(csv_file_path, 'r', newline='', encoding='utf-8-sig') as csvfile:
+            reader = csv.DictReader(csvfile)
+            store = cls(reader.fieldnames or ())
+            for row in reader:
+                for name in store.column_names:
+                    value = row.get(name)
+                    if name in INTEGER_COLUMNS:
+                        try:
+                            value = int(value)
+                        except (TypeError, ValueError):
+                            value = -1
+                    store.columns[name].append(value if value is not None else '')
+        return store
+
+    def value(self, column, index):
+        data = self.columns[column]
+        if column in INTEGER_COLUMNS:
+            return data[index] if data[index] >= 0 else None
+        return data.values[data.data[index]]
+
+    def where(self, conditions, indices=None):
+        """Return the indices of the rows (among `indices`, default all) meeting every condition.
+
+        `conditions` maps a string column to a value, a collection of values,
+        or a predicate called once per distinct value of the column.
+        """
+        if indices is None:
+            indices = range(len(self))
+        for column, condition in conditions.items():
+            string_column = self.columns[column]
+            codes = string_column.matching_codes(condition)
+            data = string_column.data
+            indices = [index for index in indices if data[index] in codes]
+        return list(indices)
+
+    def group_by(self, columns, indices=None):
+        """Return {tuple of values of `columns`: row count} over the given rows (default all), largest groups first."""
+        if indices is None:
+            indices = range(len(self))
+        data = [self.columns[column].data for column in columns]
+        counts = Counter(tuple(column_data[index] for column_data in data) for index in indices)
+        values = [self.columns[column].values for column in columns]
+        return {tuple(column_values[code] for column_values, code in zip(values, key)): count
+                for key, count in counts.most_common()}
+
+    def distinct(self, column, indices=None):
+        """Return the sorted distinct values of a string column over the given rows (default all)."""
+        return sorted((key[0] for key in self.group_by((column,), indices)), key=lambda value: (value is None, value or ''))
+
+    def rows(self, indices=None):
+        """Yield rows in the order of `column_names`."""
+        if indices is None:
+            indices = range(len(self))
+        for index in indices:
+            yield [self.value(column, index) for column in self.column_names]
+
+    def write_csv(self, csv_file_path, indices=None):
+        """Write rows in the layout of the analysis CSVs, followed by the extra columns of the input.
+
+        Missing spans are written as empty cells.
+        """
+        with open(csv_file_path, 'w', newline='') as csvfile:
+            csvwriter = csv.writer(csvfile)
+            csvwriter.writerow(self.column_names)
+            csvwriter.writerows(self.rows(indices))
+
+def parse_condition(text):
+    """Parse a command line condition: "Column=value" (exact) or "Column~regex" (search)."""
+    match = re.match(r'([^=~]+)([=~])(.*)', text, re.DOTALL)
+    if not match or match.group(1) not in RESULT_COLUMNS or match.group(1) in INTEGER_COLUMNS:
+        raise argparse.ArgumentTypeError(f"expected Column=value or Column~regex with a text column, got '{text}'")
+    column, operator, operand = match.groups()
+    if operator == '~':
+        try:
+            pattern = re.compile(operand)
+        except re.error as e:
+            raise argparse.ArgumentTypeError(f"invalid regex '{operand}': {e}")
+        return column, lambda value: value is not None and pattern.search(value) is not None
+    return column, operand
+
+def main():
+    parser = argparse.ArgumentParser(description='Filter and aggregate the CSV results of the Terraform analysis scripts.')
+    parser.add_argument('csv_file', help='Results CSV, e.g. terraform_parsed_results_generalized_1.csv')
+    parser.add_argument('--where', action='append', type=parse_condition, default=[],
+                        help='Keep rows where Column=value, or Column~regex matches (repeatable; all must hold)')
+    parser.add_argument('--group-by', nargs='+', choices=[c for c in RESULT_COLUMNS if c not in INTEGER_COLUMNS],
+                        metavar='COLUMN', help='Count the kept rows per distinct combination of these columns')
+    parser.add_argument('--output', help='Write the kept rows to this CSV, in the analysis layout plus any extra columns of the input')
+    args = parser.parse_args()
+
+    store = ResultStore.from_csv(args.csv_file)
+    indices = None
+    for column, condition in args.where:
+        indices = store.where({column: condition}, indices)
+    if indices is None:
+        indices = range(len(store))
+
+    if args.group_by:
+        for key, count in store.group_by(args.group_by, indices).items():
+            print(f"{count}\t" + '\t'.join('' if value is None else str(value) for value in key))
+    if args.output:
+        store.write_csv(args.output, indices)
+        print(f"{len(indices)} rows written to {args.output}")
+    elif not args.group_by:
+        print(f"{len(indices)} of {len(store)} rows match")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from hcl_parser import parse_hcl
+from tf_analysis import FILES_PER_TASK, find_files
+
+DEFAULT_SYMBOL_INDEX = "terraform_symbols.json"
+
+# Bump when the layout of the index file changes
+SYMBOL_INDEX_VERSION = 2
+
+# `var.<name>` anywhere in an expression, including inside "${...}" templates
+VAR_REFERENCE = re.compile(r'(?<![\w.])var\.([A-Za-z_][\w-]*)')
+
+# Module block arguments that configure the call itself instead of setting an input variable
+MODULE_META_ARGUMENTS = frozenset({'source', 'version', 'count', 'for_each', 'providers', 'depends_on'})
+
+# Kinds of entries recorded per variable name
+SYMBOL_KINDS = ('definitions', 'references', 'assignments', 'module_arguments')
+
+def _module_source_dir(file_dir, source):
+    """Return the directory a local module source ("./x", "../x") points at, or None for registry/remote sources."""
+    source = source.strip().strip('"')
+    if source.startswith('./') or source.startswith('../'):
+        return os.path.normpath(os.path.join(file_dir, source))
+    return None
+
+class SymbolIndex:
+    """Links every Terraform input variable to the places that define, read and set it.
+
+    For each variable name the index records, as [path id, start, end] byte
+    spans:
+      - definitions: `variable "<name>"` blocks (span of their default, or of
+        the block header for a variable without one),
+      - references: every `var.<name>` in an expression,
+      - assignments: `<name> = ...` in .tfvars files,
+      - module_arguments: `<name> = ...` in `module` blocks, with the id of the
+        local module directory the call targets (-1 for remote sources).
+    Paths and module directories are stored once in a table and referred to by
+    id, and the whole index is one compact JSON document, so loading it takes
+    milliseconds and a query is a dictionary lookup. A Terraform module is a
+    directory, so the module of any entry is the directory of its file.
+    """
+
+    def __init__(self, paths=None, symbols=None):
+        self.paths = paths or []
+        self.symbols = symbols or {}
+        self._path_ids = {path: index for index, path in enumerate(self.paths)}
+
+    def _path_id(self, path):
+        path_id = self._path_ids.get(path)
+        if path_id is None:
+            path_id = self._path_ids[path] = len(self.paths)
+            self.paths.append(path)
+        return path_id
+
+    def _add(self, name, kind, entry):
+        self.symbols.setdefault(name, {}).setdefault(kind, []).append(entry)
+
+    def add_file(self, file_path, rows, blocks):
+        """Record the symbols of one parsed file, given its rows and top-level block headers (see parse_hcl)."""
+        file_id = self._path_id(file_path)
+        file_dir = os.path.dirname(file_path)
+        is_tfvars = file_path.endswith('.tfvars')
+        # Every declared variable, from its header, so blocks without attributes count too;
+        # the span is replaced by that of the default when there is one
+        definitions = {name: [start, end] for block_type, name, start, end in blocks if block_type == 'variable'}
+        module_dirs = {}
+
+        for row in rows:
+            if row.type is None:
+                if is_tfvars:
+                    self._add(row.attribute, 'assignments', [file_id, row.start, row.end])
+                continue
+            if row.type == 'variable' and row.attribute == 'default' and row.name in definitions:
+                definitions[row.name] = [row.start, row.end]
+            elif row.type == 'module' and row.attribute == 'source':
+                module_dirs[row.name] = _module_source_dir(file_dir, row.value)
+            for match in VAR_REFERENCE.finditer(row.value):
+                # Spans are byte offsets while the value is decoded text: re-encode the prefix
+                start = row.start + len(row.value[:match.start()].encode('utf-8'))
+                self._add(match.group(1), 'references', [file_id, start, start + len(match.group().encode('utf-8'))])
+
+        for name, (start, end) in definitions.items():
+            self._add(name, 'definitions', [file_id, start, end])
+        # Module arguments are resolved once the whole block, and so its source, has been seen
+        for row in rows:
+            if row.type == 'module' and '.' not in row.attribute and row.attribute not in MODULE_META_ARGUMENTS:
+                target_dir = module_dirs.get(row.name)
+                target_id = self._path_id(target_dir) if target_dir is not None else -1
+                self._add(row.attribute, 'module_arguments', [file_id, row.start, row.end, target_id])
+
+    def save(self, index_path=DEFAULT_SYMBOL_INDEX):
+        """Write the index atomically as compact JSON."""
+        directory = os.path.dirname(os.path.abspath(index_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump({'version': SYMBOL_INDEX_VERSION, 'paths': self.paths, 'symbols': self.symbols},
+                          file, separators=(',', ':'))
+            os.replace(tmp_path, index_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, index_path=DEFAULT_SYMBOL_INDEX):
+        """Load an index written by `save`; raises ValueError for an index of another version."""
+        with open(index_path, 'r') as file:
+            data = json.load(file)
+        if data.get('version') != SYMBOL_INDEX_VERSION:
+            raise ValueError(f"{index_path} was built by another version of tf_symbols.py; rebuild it.")
+        return cls(data['paths'], data['symbols'])
+
+    def lookup(self, name, module_dir=None):
+        """Return {kind: [(path, start, end)]} for a variable, optionally limited to one module directory.
+
+        With a module directory, definitions and references are those of
+        that module, module arguments those of calls targeting it, and
+        assignments those of .tfvars files in it.
+        """
+        entries = self.symbols.get(name, {})
+        if module_dir is not None:
+            module_dir = os.path.normpath(module_dir)
+        result = {}
+        for kind in SYMBOL_KINDS:
+            found = []
+            for entry in entries.get(kind, []):
+                path = self.paths[entry[0]]
+                if module_dir is not None:
+                    if kind == 'module_arguments':
+                        entry_dir = self.paths[entry[3]] if entry[3] >= 0 else None
+                    else:
+                        entry_dir = os.path.dirname(path)
+                    if entry_dir is None or os.path.normpath(entry_dir) != module_dir:
+                        continue
+                found.append((path, entry[1], entry[2]))
+            result[kind] = found
+        return result
+
+def _symbol_task(file_paths):
+    """Worker task: return [(rows, top-level blocks)] for each file.
+
+    Block headers are not part of the cached rows, so files are parsed here
+    rather than through tf_analysis.parse_files.
+    """
+    results = []
+    for file_path in file_paths:
+        with open(file_path, 'rb') as file:
+            data = file.read()
+        blocks = []
+        rows = parse_hcl(data, blocks)
+        results.append((rows, blocks))
+    return results
+
+def build_index(directory, jobs=None):
+    """Build the symbol index of every .tf/.tfvars file under a directory, parsing across a process pool."""
+    index = SymbolIndex()
+    file_paths = list(find_files(directory, ('.tf', '.tfvars')))
+    tasks = [file_paths[start:start + FILES_PER_TASK] for start in range(0, len(file_paths), FILES_PER_TASK)]
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+        for task, results in zip(tasks, executor.map(_symbol_task, tasks)):
+            for file_path, (rows, blocks) in zip(task, results):
+                index.add_file(file_path, rows, blocks)
+    return index
+
+def describe(path, start, end, lines_cache):
+    """Format an entry as path:line: source text."""
+    data = lines_cache.get(path)
+    if data is None:
+        try:
+            with open(path, 'rb') as file:
+                data = lines_cache[path] = file.read()
+        except OSError:
+            return f"{path}@{start}-{end}"
+    line = data.count(b'\n', 0, start) + 1
+    text = data[start:end].decode('utf-8', 'replace').replace('\n', ' ')
+    return f"{path}:{line}: {text}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Index Terraform variables with their references, .tfvars assignments and module arguments.')
+    parser.add_argument('--index', default=DEFAULT_SYMBOL_INDEX, help='Symbol index file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='Index every .tf and .tfvars file under a directory')
+    build_parser.add_argument('directory', help='Directory to index, e.g. a repository or the terraform_checkouts directory')
+    build_parser.add_argument('--jobs', type=int, help='Number of parsing processes (defaults to the CPU count)')
+
+    query_parser = commands.add_parser('query', help='Show what defines, reads and sets a variable')
+    query_parser.add_argument('names', nargs='+', help='Variable names')
+    query_parser.add_argument('--module', help='Only consider the module in this directory')
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        started = time.monotonic()
+        index = build_index(args.directory, args.jobs)
+        index.save(args.index)
+        print(f"Indexed {len(index.symbols)} variables from {args.directory} in {time.monotonic() - started:.1f}s; written to {args.index}")
+        return
+
+    started = time.monotonic()
+    index = SymbolIndex.load(args.index)
+    loaded = time.monotonic() - started
+    lines_cache = {}
+    for name in args.names:
+        found = index.lookup(name, args.module)
+        print(f"var.{name}:")
+        for kind in SYMBOL_KINDS:
+            print(f"  {kind.replace('_', ' ')} ({len(found[kind])}):")
+            for entry in found[kind]:
+                print(f"    {describe(*entry, lines_cache)}")
+    print(f"(index loaded in {loaded * 1000:.0f} ms)")
+
+if __name__ == '__main__':
+    main()
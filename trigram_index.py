@@ -0,0 +1,279 @@
+import argparse
+import os
+import re
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+from git_utils import ensure_repository, iter_blobs, ls_tree, rev_parse
+from local_scanner import repository_path, is_binary, DEFAULT_WORKDIR, DEFAULT_MAX_FILE_SIZE
+from repo_discovery import add_discovery_arguments, discover_repositories
+
+DEFAULT_INDEX_FILE = "trigram_index.sqlite"
+
+# Number of blobs sent to a worker process in one task
+BLOBS_PER_TASK = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, head TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS blobs (id INTEGER PRIMARY KEY, sha TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS files (repo_id INTEGER NOT NULL, path TEXT NOT NULL, blob_id INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS files_by_repo ON files (repo_id);
+CREATE INDEX IF NOT EXISTS files_by_blob ON files (blob_id);
+CREATE TABLE IF NOT EXISTS postings (trigram BLOB NOT NULL, blob_id INTEGER NOT NULL, PRIMARY KEY (trigram, blob_id)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_blob ON postings (blob_id);
+CREATE TABLE IF NOT EXISTS binary_blobs (sha TEXT PRIMARY KEY) WITHOUT ROWID;
+"""
+
+def trigrams(data):
+    """Return the set of lowercase byte trigrams of some content."""
+    data = data.lower()
+    return {data[i:i + 3] for i in range(len(data) - 2)}
+
+def _blob_trigrams(blobs):
+    """Worker task: return [(sha, trigrams)] for the blobs of a task, with None as the trigrams of binary blobs."""
+    return [(sha, None if is_binary(data) else trigrams(data)) for sha, data in blobs]
+
+def compile_pattern(pattern, regex=False, ignore_case=True):
+    """Compile a literal value or regex into the bytes pattern matched against blob content.
+
+    Content is searched as raw bytes, so a regex is compiled from its UTF-8
+    encoding: str-only escapes such as "\\u0041" or "\\N{...}" raise re.error,
+    and a quantifier after a non-ASCII literal repeats only its last byte
+    (write "(?:é)+" rather than "é+").
+    """
+    flags = re.IGNORECASE if ignore_case else 0
+    return re.compile(pattern.encode('utf-8') if regex else re.escape(pattern.encode('utf-8')), flags)
+
+def required_trigrams(pattern, regex=False):
+    """Return the trigrams any match of a literal or regex must contain.
+
+    For a regex, the literal runs of its top-level sequence are used (e.g.
+    "acct-\\d+\\.internal" requires the trigrams of "acct-" and ".internal").
+    The regex is parsed as the same bytes pattern that compile_pattern builds.
+    An empty set means the index can't narrow the search down.
+    """
+    if not regex:
+        return trigrams(pattern.encode('utf-8'))
+    try:
+        parsed = sre_parse.parse(pattern.encode('utf-8'))
+    except re.error:
+        return set()
+    required = set()
+    run = []
+    for op, arg in list(parsed) + [(None, None)]:
+        if op == sre_parse.LITERAL:
+            run.append(arg)
+            continue
+        if len(run) >= 3:
+            required |= trigrams(bytes(run))
+        run = []
+    return required
+
+class TrigramIndex:
+    """Persistent on-disk trigram index over the local mirrors of an organization.
+
+    Content is indexed per unique blob: a blob shared by many files,
+    branches or repositories is indexed once. Repositories are updated
+    incrementally: a repository whose head did not move since it was indexed
+    is skipped, and for the others only blobs the index has never seen are
+    read and indexed; binary blobs are remembered as such, so they are not
+    read again either. Queries look up the candidate blobs containing every
+    required trigram and verify the candidates against the actual content.
+    """
+
+    def __init__(self, index_path=DEFAULT_INDEX_FILE, workdir=DEFAULT_WORKDIR, jobs=None):
+        self.workdir = workdir
+        self.jobs = jobs or os.cpu_count() or 1
+        self.db = sqlite3.connect(index_path)
+        self.db.executescript(SCHEMA)
+        self._executor = None
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def indexed_head(self, full_repo_name):
+        row = self.db.execute("SELECT head FROM repos WHERE name = ?", (full_repo_name,)).fetchone()
+        return row[0] if row else None
+
+    def update_repository(self, full_repo_name, token=None, max_file_size=DEFAULT_MAX_FILE_SIZE):
+        """Bring the index of one repository up to date; return the number of newly indexed blobs, or None if unchanged."""
+        path = ensure_repository(full_repo_name, repository_path(self.workdir, full_repo_name), token=token)
+        head = rev_parse(path)
+        if self.indexed_head(full_repo_name) == head:
+            return None
+
+        files = [(sha, file_path) for sha, size, file_path in ls_tree(path, head) if size <= max_file_size]
+        known = {}
+        binary = set()
+        shas = list({sha for sha, _ in files})
+        for start in range(0, len(shas), 500):
+            batch = shas[start:start + 500]
+            known.update(self.db.execute(f"SELECT sha, id FROM blobs WHERE sha IN ({','.join('?' * len(batch))})", batch))
+            binary.update(row[0] for row in self.db.execute(
+                f"SELECT sha FROM binary_blobs WHERE sha IN ({','.join('?' * len(batch))})", batch))
+        new_shas = [sha for sha in shas if sha not in known and sha not in binary]
+
+        with self.db:
+            for sha, blob_trigrams in self._trigram_sets(path, new_shas):
+                if blob_trigrams is None:
+                    self.db.execute("INSERT OR IGNORE INTO binary_blobs (sha) VALUES (?)", (sha,))
+                    continue
+                blob_id = self.db.execute("INSERT INTO blobs (sha) VALUES (?)", (sha,)).lastrowid
+                known[sha] = blob_id
+                self.db.executemany("INSERT INTO postings (trigram, blob_id) VALUES (?, ?)",
+                                    ((trigram, blob_id) for trigram in blob_trigrams))
+            self.db.execute("INSERT INTO repos (name, head) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET head = excluded.head",
+                            (full_repo_name, head))
+            repo_id = self.db.execute("SELECT id FROM repos WHERE name = ?", (full_repo_name,)).fetchone()[0]
+            self.db.execute("DELETE FROM files WHERE repo_id = ?", (repo_id,))
+            # Binary blobs get no id and are left out of the index
+            self.db.executemany("INSERT INTO files (repo_id, path, blob_id) VALUES (?, ?, ?)",
+                                ((repo_id, file_path, known[sha]) for sha, file_path in files if sha in known))
+        return len(new_shas)
+
+    def _trigram_sets(self, path, shas):
+        # The indexing pool is only started once there is something to index
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.jobs)
+
+        def tasks():
+            task = []
+            for sha, data in iter_blobs(path, shas):
+                task.append((sha, data))
+                if len(task) >= BLOBS_PER_TASK:
+                    yield task
+                    task = []
+            if task:
+                yield task
+
+        pending = deque()
+        for task in tasks():
+            pending.append(self._executor.submit(_blob_trigrams, task))
+            # Keep a bounded number of tasks in flight so memory stays flat
+            if len(pending) >= self.jobs * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+    def collect_garbage(self):
+        """Drop blobs (and their postings) no longer referenced by any indexed file.
+
+        Binary blobs are kept: they are recorded by SHA only and not linked to files.
+        """
+        with self.db:
+            self.db.execute("DELETE FROM postings WHERE blob_id NOT IN (SELECT blob_id FROM files)")
+            self.db.execute("DELETE FROM blobs WHERE id NOT IN (SELECT blob_id FROM files)")
+
+    def candidates(self, required):
+        """Return the ids of the blobs containing every required trigram (all blobs when none are required)."""
+        if not required:
+            return [row[0] for row in self.db.execute("SELECT id FROM blobs")]
+        required = list(required)
+        query = (f"SELECT blob_id FROM postings WHERE trigram IN ({','.join('?' * len(required))}) "
+                 f"GROUP BY blob_id HAVING COUNT(*) = ?")
+        return [row[0] for row in self.db.execute(query, required + [len(required)])]
+
+    def search(self, pattern, regex=False, ignore_case=True):
+        """Yield match records for a literal value or a simple regex across the indexed repositories."""
+        matcher = compile_pattern(pattern, regex, ignore_case)
+        blob_ids = self.candidates(required_trigrams(pattern, regex))
+        if not blob_ids:
+            return
+
+        # Group the candidate files by repository so each mirror is read with a single cat-file process
+        files_by_repo = {}
+        for start in range(0, len(blob_ids), 500):
+            batch = blob_ids[start:start + 500]
+            rows = self.db.execute(
+                f"SELECT repos.name, repos.head, files.path, blobs.sha FROM files "
+                f"JOIN repos ON repos.id = files.repo_id JOIN blobs ON blobs.id = files.blob_id "
+                f"WHERE files.blob_id IN ({','.join('?' * len(batch))})", batch)
+            for repo_name, head, file_path, sha in rows:
+                files_by_repo.setdefault((repo_name, head), {}).setdefault(sha, []).append(file_path)
+
+        for (repo_name, head), paths_by_blob in sorted(files_by_repo.items()):
+            path = repository_path(self.workdir, repo_name)
+            for sha, data in iter_blobs(path, list(paths_by_blob)):
+                if matcher.search(data):
+                    for file_path in sorted(paths_by_blob[sha]):
+                        yield {
+                            'repo': repo_name,
+                            'file': file_path,
+                            'value': pattern,
+                            'html_url': f"https://github.com/{repo_name}/blob/{head}/{file_path}"
+                        }
+
+def build(args):
+    token = args.token
+    with TrigramIndex(args.index, args.workdir, jobs=args.jobs) as index:
+        for record in discover_repositories(args, token=token):
+            full_repo_name = record['full_name']
+            try:
+                indexed = index.update_repository(full_repo_name, token=token, max_file_size=args.max_file_size)
+            except RuntimeError as e:
+                print(f"Skipping repository {full_repo_name}: {e}")
+                continue
+            if indexed is None:
+                print(f"{full_repo_name}: unchanged since it was indexed.")
+            else:
+                print(f"{full_repo_name}: indexed {indexed} new blobs.")
+        index.collect_garbage()
+    print(f"Index written to {args.index}")
+
+def query(args):
+    with TrigramIndex(args.index, args.workdir) as index:
+        for pattern in args.values:
+            started = time.monotonic()
+            count = 0
+            for match in index.search(pattern, regex=args.regex, ignore_case=not args.case_sensitive):
+                count += 1
+                print(f"Repository: {match['repo']}, File: {match['file']}, Value: {match['value']}, URL: {match['html_url']}")
+            print(f"'{pattern}': {count} matches in {time.monotonic() - started:.3f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and query a persistent trigram index over local mirrors of an organization.')
+    parser.add_argument('--index', default=DEFAULT_INDEX_FILE, help='Index database file')
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR, help='Directory holding the clones and mirrors (shared with the local scanner backend)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='Clone or update the repositories of an organization and index them incrementally')
+    add_discovery_arguments(build_parser, '-o', '--organization', required=True, org_help='GitHub organization name')
+    build_parser.add_argument('-t', '--token', default=os.getenv('GITHUB_TOKEN'), help='GitHub access token (defaults to GITHUB_TOKEN)')
+    build_parser.add_argument('--max-file-size', type=int, default=DEFAULT_MAX_FILE_SIZE, help='Skip files larger than this many bytes')
+    build_parser.add_argument('--jobs', type=int, help='Number of indexing processes (defaults to the CPU count)')
+
+    query_parser = commands.add_parser('query', help='Find the files containing literal values or simple regexes')
+    query_parser.add_argument('values', nargs='+', help='Values to look for (enclose phrases in quotes)')
+    query_parser.add_argument('--regex', action='store_true', help='Treat the values as regular expressions, matched against the raw UTF-8 bytes of each file')
+    query_parser.add_argument('--case-sensitive', action='store_true', help='Match case-sensitively')
+
+    args = parser.parse_args()
+    if args.command == 'query' and args.regex:
+        for pattern in args.values:
+            try:
+                compile_pattern(pattern, regex=True)
+            except re.error as e:
+                parser.error(f"invalid regex '{pattern}': {e}")
+    if args.command == 'build':
+        build(args)
+    else:
+        query(args)
+
+if __name__ == '__main__':
+    main()